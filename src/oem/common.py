@@ -2,8 +2,14 @@
 
 
 import os
+import stat
 import traceback
 import re
+import hashlib
+import filecmp
+import tempfile
+
+from lxml import etree
 
 from kids.xml import xmlize, load
 from kids.cmd import msg
@@ -49,6 +55,64 @@ def ooop_object_digest(obj, size=80):
     return digest
 
 
+def xml_digest(elt):
+    """Return a digest of XML element ``elt`` to detect its changes
+
+    Order of attributes, and blank text used for indentation, don't
+    count, nor the form used to escape text:
+
+        >>> from lxml import etree
+        >>> digest = lambda s: xml_digest(etree.fromstring(s))
+        >>> digest('<record id="a" model="m"><field name="f">1</field>'
+        ...        '</record>') == digest(
+        ...     '<record model="m" id="a">\\n  <field name="f">1</field>\\n'
+        ...     '</record>')
+        True
+        >>> digest('<field name="f">a &lt; b</field>') == \\
+        ...     digest('<field name="f"><![CDATA[a < b]]></field>')
+        True
+
+    But any other change does:
+
+        >>> digest('<field name="f">1</field>') == \\
+        ...     digest('<field name="f">1 </field>')
+        False
+        >>> digest('<record><!-- a --></record>') == \\
+        ...     digest('<record><!-- b --></record>')
+        False
+
+    """
+    digest = hashlib.sha1()
+
+    def feed(*values):
+        for value in values:
+            if isinstance(value, unicode):
+                value = value.encode("utf-8")
+            digest.update(value + "\0")
+
+    def feed_text(text):
+        if text and text.strip():
+            feed("text", text)
+
+    for event, e in etree.iterwalk(elt, events=("start", "end",
+                                                 "comment", "pi")):
+        if event == "start":
+            feed("start", e.tag)
+            for name, value in sorted(e.attrib.items()):
+                feed(name, value)
+            feed_text(e.text)
+            continue
+        if event == "end":
+            feed("end")
+        else:
+            ## objectified trees don't give the text of comments
+            feed(event, etree.tostring(e, with_tail=False,
+                                       encoding="unicode"))
+        if e is not elt:
+            feed_text(e.tail)
+    return digest.hexdigest()
+
+
 def caps_normalize_model_name(name):
     """Normalize name for python class"""
     return ooop_normalize_model_name(name)
@@ -149,6 +213,66 @@ def get_refs_in_eval(source):
     return _find_refs_in_expr(AstParse(expr))
 
 
+def strongly_connected_components(nodes, successors):
+    """Return the strongly connected components of a graph
+
+    ``successors(node)`` gives the nodes that ``node`` points to. This is
+    Tarjan's algorithm, without recursion so that long chains of nodes
+    don't hit the recursion limit. Components are lists of nodes, and
+    come out after all components they point to:
+
+        >>> graph = {1: [2], 2: [3], 3: [1, 4], 4: [], 5: [5, 4]}
+        >>> strongly_connected_components(sorted(graph), graph.get)
+        [[4], [3, 2, 1], [5]]
+
+    Long chains are fine:
+
+        >>> chain = strongly_connected_components(
+        ...     range(100000), lambda n: [(n + 1) % 100000])
+        >>> len(chain), len(chain[0])
+        (1, 100000)
+
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors(child))))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
 def add_import(init_file, module_name):
 
     if not os.path.isfile(init_file):
@@ -182,6 +306,70 @@ def add_import(init_file, module_name):
     print "updated '%s'." % init_file
 
 
+def temp_path(path):
+    """Return the path of a new empty file, to replace ``path`` later
+
+    It is created next to ``path``, so that it can be renamed over it.
+
+    """
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path),
+                                prefix=".%s." % os.path.basename(path),
+                                suffix=".tmp")
+    os.close(fd)
+    return temp
+
+
+def _rename(temp, path):
+    if os.path.exists(path):
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0666 & ~umask
+    os.chmod(temp, mode)
+    os.rename(temp, path)
+
+
+def replace_file(path, temp):
+    """Atomically replace ``path`` by file ``temp``, if content differs
+
+    Returns False, and removes ``temp``, if ``path`` was left untouched.
+
+    """
+    if os.path.exists(path) and filecmp.cmp(temp, path, shallow=False):
+        os.unlink(temp)
+        return False
+    _rename(temp, path)
+    return True
+
+
+def write_file(path, contents):
+    """Atomically write ``contents`` to ``path``, if content differs
+
+    Returns False if ``path`` was left untouched.
+
+        >>> import kids.file as kf
+        >>> path = kf.tmpfile()
+        >>> write_file(path, "foo"), write_file(path, "foo")
+        (True, False)
+        >>> print(kf.get_contents(path))
+        foo
+        >>> kf.rm(path)
+
+    """
+    if os.path.exists(path) and os.path.getsize(path) == len(contents) \
+           and kf.get_contents(path, binary=True) == contents:
+        return False
+    temp = temp_path(path)
+    try:
+        kf.put_contents(temp, contents)
+        _rename(temp, path)
+    except:
+        os.unlink(temp)
+        raise
+    return True
+
+
 def _empty_data_xml():
     return xmlize(tmpl.render(T / "xml" / "main.xml", body=''))
 
@@ -288,23 +476,40 @@ class OemCommand(DbMixin, BaseCommand):
         return os.path.basename(self.root)
 
     def put_contents(self, filename, contents):
+        """Write ``contents`` in ``filename``, unless it is already there"""
+        if isinstance(contents, unicode):
+            contents = contents.encode('utf-8')
         full_name = self.file_path(filename)
-        if os.path.exists(full_name):
+        self._report_write(filename, os.path.exists(full_name),
+                           write_file(full_name, contents))
+
+    def put_file(self, filename, temp):
+        """Replace ``filename`` by file ``temp``, if content differs"""
+        full_name = self.file_path(filename)
+        self._report_write(filename, os.path.exists(full_name),
+                           replace_file(full_name, temp))
+
+    def _report_write(self, filename, existed, changed):
+        if not changed:
+            print "  unchanged %r." % filename
+        elif existed:
             print "  overwrite '%s'." % filename
         else:
             print "  write %r." % filename
-        if isinstance(contents, unicode):
-            contents = contents.encode('utf-8')
-        kf.put_contents(full_name, contents)
 
     def add_xml(self, fname, content):
         self.put_contents(fname, content)
+        self.declare_xml(fname)
+
+    def declare_xml(self, *fnames):
+        """Add files to the data section of the module metadata"""
         with self.meta as meta:
-            if fname in meta["data"]:
-                return
-            meta["data"].append(fname)
-            print "  added %r to %r" \
-                  % (fname, os.path.basename(self.metadata_file))
+            for fname in fnames:
+                if fname in meta["data"]:
+                    continue
+                meta["data"].append(fname)
+                print "  added %r to %r" \
+                      % (fname, os.path.basename(self.metadata_file))
 
     def file_path(self, relpath):
         return os.path.join(self.root, relpath)
@@ -315,10 +520,9 @@ class OemCommand(DbMixin, BaseCommand):
     def tuple2xmlid(self, t):
         return tuple2xmlid(t, default_module=self.module_name)
 
-    def initialize(self, db, load_models=False, interactive=False):
+    def initialize(self, db, interactive=False):
         self.db_identifier = db
-        self.o = self.db[db].ooop(load_models=load_models,
-                                  interactive=interactive)
+        self.o = self.db[db].ooop(interactive=interactive)
 
     @cache
     @property
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Summarize XML data files of a module
+
+Reading a data file is only needed to know which records it defines
+and which xml_ids they reference. ``summarize()`` gives this as simple
+picklable values, so that files can be read by several processes at
+once, and summaries kept between invocations.
+
+    >>> import kids.file as kf
+    >>> path = kf.tmpfile()
+    >>> kf.put_contents(path, '''<?xml version="1.0" encoding="utf-8"?>
+    ... <openerp>
+    ...   <data>
+    ...     <!-- a comment -->
+    ...     <record id="p1" model="res.partner">
+    ...       <field name="parent_id" ref="base.main_partner"/>
+    ...       <field name="category_id" eval="[(4, ref('cat'))]"/>
+    ...     </record>
+    ...     <menuitem id="m1" parent="base.menu_base" action="bad"/>
+    ...     <record id="p2" model="res.partner">
+    ...       <field name="category_id" eval="[(4, ref(cat)"/>
+    ...     </record>
+    ...   </data>
+    ... </openerp>
+    ... ''')
+
+    >>> summary = summarize(path, "mymod")
+    >>> for record in summary["records"]:
+    ...     print("%(line)d: %(tag)s %(id)s" % record)
+    ...     print("  deps: %s" % sorted(record["deps"]))
+    ...     print("  errors: %r" % record["errors"])
+    5: record p1
+      deps: [('base', 'main_partner'), ('mymod', 'cat')]
+      errors: []
+    9: menuitem m1
+      deps: [('base', 'menu_base'), ('mymod', 'bad')]
+      errors: []
+    10: record p2
+      deps: []
+      errors: [('[(4, ref(cat)', 'unexpected EOF while parsing')]
+
+Several files can be summarized by as many processes, with the same
+result:
+
+    >>> summarize_files([path, path], "mymod", jobs=2) == [summary, summary]
+    True
+
+    >>> kf.rm(path)
+
+"""
+
+import multiprocessing
+
+from kids.xml import xml2string, load
+
+from . import common
+from .ooop_utils import xmlid2tuple
+
+
+def data_records(xml):
+    """Generate record elements of data file tree ``xml``"""
+    for elt in xml.getchildren():
+        if elt.tag != "data":
+            continue
+        for record in elt.getchildren():
+            if record.tag == "comment":
+                continue
+            yield record
+
+
+def record_deps(record, module_name):
+    """Return xml_ids used by XML ``record``, and errors met
+
+    Errors are the (eval, exception) of ``eval`` attributes that
+    couldn't be parsed.
+
+    """
+    deps = set()
+    errors = []
+    if record.tag == "menuitem":
+        deps |= set(
+            xmlid2tuple(record.attrib[a], module_name)
+            for a in ['action', 'parent']
+            if record.attrib.get(a, False))
+    deps |= set(
+        [xmlid2tuple(xmlid, module_name)
+         for xmlid in record.xpath(".//@ref")])
+    ## must get ref() usages !
+    for e in record.xpath(".//@eval"):
+        try:
+            deps |= set(xmlid2tuple(xmlid, module_name)
+                        for xmlid in common.get_refs_in_eval(e))
+        except Exception, exc:
+            errors.append((e, exc))
+    return deps, errors
+
+
+def summarize(path, module_name):
+    """Return the summary of records defined in data file ``path``
+
+    This is a dict with a ``records`` list, which holds per record its
+    ``tag``, ``line``, ``id``, referenced xml_ids in ``deps``, eval
+    ``errors`` as (eval, message) and ``digest``. Records without ids
+    only get their ``xml`` instead.
+
+    """
+    records = []
+    for record in data_records(load(path)):
+        if 'id' not in record.attrib:
+            records.append({
+                "tag": record.tag,
+                "line": record.sourceline,
+                "id": None,
+                "xml": xml2string(record, xml_declaration=False),
+            })
+            continue
+        deps, errors = record_deps(record, module_name)
+        records.append({
+            "tag": record.tag,
+            "line": record.sourceline,
+            "id": record.attrib['id'],
+            "deps": deps,
+            "errors": [(e, getattr(exc, "msg", str(exc)))
+                       for e, exc in errors],
+            "digest": common.xml_digest(record),
+        })
+    return {"records": records}
+
+
+def _summarize(args):
+    return summarize(*args)
+
+
+def summarize_files(paths, module_name, jobs=None):
+    """Return summaries of data files ``paths``, in order
+
+    Files are read by ``jobs`` worker processes, defaulting to the
+    number of CPUs. A single file is read in the current process.
+
+    """
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(paths))
+    if jobs <= 1:
+        return [summarize(path, module_name) for path in paths]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return pool.map(_summarize, [(path, module_name) for path in paths],
+                        chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
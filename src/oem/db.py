@@ -2,6 +2,7 @@
 
 import time
 import re
+import atexit
 import getpass
 import socket
 
@@ -9,6 +10,9 @@ from kids.cache import cache
 from kids.cmd import msg
 from kids.ansi import aformat
 from . import ooop_utils
+from .store import FieldsCache, SessionStore
+from .transport import ConnectionPool, PooledTransport
+from .jsonrpc import JsonRpcTransport
 
 
 _DEFAULT_NOT_SET = object()
@@ -31,7 +35,7 @@ class DbInstance(object):
         self.cfg = cfg
 
     @cache
-    def ooop(self, lang="fr_FR", load_models=False, save_password=True, interactive=False):
+    def ooop(self, lang="fr_FR", save_password=True, interactive=False):
         default_db = {
             "user": "admin",
             "password": "admin",
@@ -47,13 +51,17 @@ class DbInstance(object):
             db = self.get_creds(default_db, force_query, interactive)
             default_db.update(db)
             db = default_db
+            session = self.sessions.get(db)
             try:
                 start = time.time()
                 o = ooop_utils.OOOPExtended(
                     user=db["user"], pwd=db["password"],
                     dbname=db["dbname"],
                     uri="http://%s" % db["host"], port=int(db['port']),
-                    lang=lang, load_models=load_models)
+                    lang=lang, load_models=False,
+                    protocol=self.protocol, transport=self.transport,
+                    fields_cache=self.fields_cache,
+                    session=session)
                 connect_duration = time.time() - start
                 connected = True
             except socket.error as e:
@@ -80,6 +88,9 @@ class DbInstance(object):
         if connect_duration > 1:
             print "profile: connect took %0.3fs" % (connect_duration, )
 
+        ## what the command used of the model catalog is known at exit
+        atexit.register(self._save_session, dict(db), o, session)
+
         if save_password:
             ## Store login and password for the next time
             changed = False
@@ -95,6 +106,64 @@ class DbInstance(object):
                          self.cfg.__cfg_global__._cfg_manager._filename))
         return o
 
+    def _save_session(self, creds, o, saved):
+        """Save session of ``o`` if it differs from ``saved`` one
+
+        Saved sessions hold the whole model catalog, and are not written
+        again when unchanged. Failing to save one only costs a login.
+
+        """
+        try:
+            session = o.session()
+            if session != saved:
+                self.sessions.set(creds, session)
+        except Exception as e:
+            msg.err("Could not save session of %s: %s" % (self.label, e))
+
+    @cache
+    @property
+    def fields_cache(self):
+        """Persistent cache of models' fields for this database
+
+        It can be read without connecting to the database.
+
+        """
+        return FieldsCache(self.label)
+
+    @cache
+    @property
+    def sessions(self):
+        return SessionStore(self.label)
+
+    @property
+    def protocol(self):
+        """RPC protocol to use, ``xmlrpc`` (default) or ``jsonrpc``"""
+        protocol = self.cfg.get("protocol", "xmlrpc")
+        if protocol not in ("xmlrpc", "jsonrpc"):
+            raise ValueError("Unsupported protocol %r for database %s "
+                             "(use 'xmlrpc' or 'jsonrpc')."
+                             % (protocol, self.label))
+        return protocol
+
+    @cache
+    @property
+    def transport(self):
+        """Keep-alive transport shared by all connections to this database
+
+        Pool size and idle timeout can be set with ``pool_size`` and
+        ``idle_timeout`` in the database definition, and the size above
+        which requests are compressed with ``gzip_threshold``.
+
+        """
+        factory = JsonRpcTransport if self.protocol == "jsonrpc" \
+                  else PooledTransport
+        gzip_threshold = self.cfg.get("gzip_threshold", 64 * 1024)
+        return factory(ConnectionPool(
+            size=int(self.cfg.get("pool_size", 4)),
+            idle_timeout=float(self.cfg.get("idle_timeout", 60))),
+            gzip_threshold=None if gzip_threshold is None
+                           else int(gzip_threshold))
+
     def get_creds(self, default_db, force_query=False, interactive=False):
         conf_keys = default_db.keys()
         has_creds = "user" in conf_keys and "password" in conf_keys
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import re
 
 from kids.cache import cache
 
@@ -77,12 +78,29 @@ class BasicFileDispatcher(object):
     def __init__(self, opts):
         self.opts = opts
 
+    def _spec(self, model):
+        return self.opts.get(
+            model, self.opts.get('*', '%(_model_underscore)s_records.xml'))
+
+    def fields(self, model):
+        """Returns names of values used to dispatch records of model
+
+            >>> dispatcher = BasicFileDispatcher({
+            ...     '*': 'data/%(_model_underscore)s.xml',
+            ...     'res.partner': '%(country)s/%(name)s.xml'})
+            >>> dispatcher.fields('res.partner')
+            ['country', 'name']
+            >>> dispatcher.fields('res.users')
+            ['_model_underscore']
+
+        """
+        return re.findall(r"%\((\w+)\)", self._spec(model))
+
     def __call__(self, record):
         """Returns full path to store the given record."""
 
         model = record.get('_model')
-        fp = self.opts.get(
-            model, self.opts.get('*', '%(_model_underscore)s_records.xml'))
+        fp = self._spec(model)
         if '%' in fp:
             dct = record.copy()
             dct["_model_underscore"] = model.replace(".", "_")
@@ -9,11 +9,12 @@ import os.path
 import sys
 import time
 import copy
+import itertools
 import collections
 
 from kids.cmd import cmd, msg
 from kids.data.lib import half_split_on_predicate
-from kids.data.graph import reorder, cycle_exists
+from kids.data.graph import reorder
 from kids.cache import cache, hippie_hashing
 from kids.xml import xml2string, xmlize, load
 from kids.txt import udiff, shorten
@@ -21,7 +22,7 @@ from kids.data import mdict
 from kids.ansi import aformat
 import kids.file as kf
 
-from .ooop_utils import build_filters, ooop_normalize_model_name, obj2dct, xmlid2tuple, tuple2xmlid
+from .ooop_utils import build_filters, obj2dct, xmlid2tuple, tuple2xmlid
 
 from .tmpl import T
 from . import metadata
@@ -29,10 +30,16 @@ from . import metadata
 from . import common
 from . import metadata
 from . import tmpl
+from . import record_xml
+from . import data_file
 from .field_spec import parse_field_specs, is_field_selected
 from .dispatcher import parse_dispatch_specs, BasicFileDispatcher
 
 
+RELATIONAL_TTYPES = ['many2one', 'one2one', 'many2many', 'one2many',
+                     'reference']
+
+
 STATUS_DELETED = object()
 STATUS_ADDED = object()
 STATUS_MODIFIED = object()
@@ -60,6 +67,8 @@ class Command(common.OemCommand):
 
     DispatcherClass = BasicFileDispatcher
 
+    render_jobs = 1
+
     @cache
     @property
     def xml_id_mgr(self):
@@ -67,6 +76,12 @@ class Command(common.OemCommand):
         tracked_xml_ids, _, _ = self.map_data()
         return XmlIdManager(self.o, tracked_xml_ids.keys())
 
+    @cache
+    @property
+    def record_cache(self):
+        from .record_cache import RecordCache
+        return RecordCache(self.o, self.get_prefetched_fields_for_model)
+
     @cache
     def map_data(self):
 
@@ -87,6 +102,7 @@ class Command(common.OemCommand):
         xml_files = self.meta.get('data', [])
         module_dependencies = ["base", ]
 
+        data_files = []
         for xml_file in xml_files:
             if not os.path.exists(self.file_path(xml_file)):
                 err_msg("file %r referenced in data section of "
@@ -96,92 +112,151 @@ class Command(common.OemCommand):
             if xml_file.endswith(".csv"):
                 err_msg("%s: skipping CSV file." % xml_file)
                 continue
-            xml = load(self.file_path(xml_file))
+            data_files.append(xml_file)
+        summaries = zip(data_files, self._data_file_summaries(data_files))
+
+        ## position of first definition of each xmlid, to find references
+        ## to records that are not defined before them.
+        defined_at = {}
+        for file_index, (xml_file, summary) in enumerate(summaries):
+            for index, record in enumerate(summary["records"]):
+                if record["id"] is not None:
+                    defined_at.setdefault(self.xmlid2tuple(record["id"]),
+                                          (file_index, index))
+
+        ## position and "file:line" of the definition kept for each xmlid
+        locations = {}
+        for file_index, (xml_file, summary) in enumerate(summaries):
             tracked_files[xml_file] = {
-                'xml_file_content': xml,
+                'xml_file_content': None,
+                'xml_ids': [],
             }
             ## XXXvlab: will not catch complex situation
             file_deps = set()
-            for elt in xml.getchildren():
-                if elt.tag != "data":
+            for index, record in enumerate(summary["records"]):
+                where = "%s:%d" % (xml_file, record["line"])
+                if record["id"] is None:
+                    err_msg("%s: !! Error while reading %s: No id found !\n%s"
+                            % (where, record["tag"], record["xml"]))
                     continue
-                for record in elt.getchildren():
-                    if record.tag == "comment":
-                        continue
-                    if 'id' not in record.attrib:
-                        err_msg("!! Error while reading %s: No id found !\n%s"
-                                % (record.tag,
-                                   xml2string(record, xml_declaration=False)))
-                        continue
-                    attrib_id = record.attrib['id']
-                    deps = set()
-                    if record.tag == "menuitem":
-                        deps |= set(
-                            xmlid2tuple(record.attrib[a],
-                                        self.module_name)
-                            for a in ['action', 'parent']
-                            if record.attrib.get(a, False))
-                    ## Get deps
-
-                    deps |= set(
-                        [xmlid2tuple(xmlid, self.module_name)
-                         for xmlid in record.xpath(".//@ref")])
-                    evals = record.xpath(".//@eval")
-                    if evals:
-                        ## must get ref() usages !
-                        xmlids = []
-                        for e in evals:
-                            try:
-                                xmlids.extend(common.get_refs_in_eval(e))
-                            except Exception, exc:
-                                err_msg(
-                                    "%s: %s %s: Exception while evaluating: %r, %s"
-                                    % (xml_file, record.tag, attrib_id, e, exc.msg))
-                                continue
-                        deps |= set(xmlid2tuple(xmlid, self.module_name)
-                                    for xmlid in xmlids)
-
-                    ## Check deps
-
-                    for module, xmlid in deps:
-                        if module != self.module_name:
-                            ## Check that we depens of this module
-                            if module not in module_dependencies:
-                                module_dependencies.append(module)
-                        else:
-                            t = self.xmlid2tuple(xmlid)
-                            if t not in res and not t[1].startswith("model_"):
-                                err_msg("%s: %s %s references %s.%s which is not defined (yet?)." \
-                                        % (xml_file, record.tag, attrib_id, module, xmlid))
-
-                    ## Check for duplicate xmlid:
-                    local_xml_id = self.xmlid2tuple(attrib_id)
-                    if local_xml_id in res:
-                        err_msg("%s: %s %s already defined in file %s." \
-                                % (xml_file, record.tag, attrib_id, res[local_xml_id]['filename']))
-
-                    res[self.xmlid2tuple(attrib_id)] = {
-                        'filename': xml_file,
-                        'record_xml': record,
-                        'deps': deps,
-                    }
-
-                    file_deps |= deps
-                    ## Check cyclicity
-
-                    if cycle_exists(self.xmlid2tuple(attrib_id),
-                                    lambda n: list(res.get(n, {'deps': []})['deps'])):
-                        err_msg("%s: %s %s introduce a cyclic reference."
-                                % (xml_file, record.tag, attrib_id))
+                attrib_id = record["id"]
+                deps = record["deps"]
+                for e, exc_msg in record["errors"]:
+                    err_msg(
+                        "%s: %s %s: Exception while evaluating: %r, %s"
+                        % (where, record["tag"], attrib_id, e, exc_msg))
+
+                ## Check deps
+
+                for module, xmlid in deps:
+                    if module != self.module_name:
+                        ## Check that we depens of this module
+                        if module not in module_dependencies:
+                            module_dependencies.append(module)
+                    else:
+                        t = self.xmlid2tuple(xmlid)
+                        if defined_at.get(t, (file_index, index)) >= \
+                               (file_index, index) and \
+                               not t[1].startswith("model_"):
+                            err_msg("%s: %s %s references %s.%s which is not defined (yet?)." \
+                                    % (where, record["tag"], attrib_id, module, xmlid))
+
+                ## Check for duplicate xmlid:
+                local_xml_id = self.xmlid2tuple(attrib_id)
+                if local_xml_id in res:
+                    err_msg("%s: %s %s already defined in file %s." \
+                            % (where, record["tag"], attrib_id, res[local_xml_id]['filename']))
+
+                res[local_xml_id] = {
+                    'filename': xml_file,
+                    'record_xml': None,
+                    'digest': record["digest"],
+                    'deps': deps,
+                }
+                tracked_files[xml_file]['xml_ids'].append(local_xml_id)
+
+                locations[local_xml_id] = (file_index, index, where)
+                file_deps |= deps
 
             tracked_files[xml_file]["deps"] = file_deps
 
+        ## Check cyclicity
+
+        for component in common.strongly_connected_components(
+                sorted(res),
+                lambda n: [d for d in res[n]['deps'] if d in res]):
+            if len(component) == 1 and \
+                   component[0] not in res[component[0]]['deps']:
+                continue
+            err_msg("cyclic reference between %s."
+                    % ", ".join("%s (%s)" % (self.tuple2xmlid(x),
+                                             locations[x][2])
+                                for x in sorted(component,
+                                                key=locations.get)))
+
         if error_status["no_error"] is False:
             print("    ...", end="")
         print(aformat("done", attrs=["bold", ]) + " in %.3fs. (%d files, %d records)"
               % (time.time() - start, len(xml_files), len(res)))
         return res, module_dependencies, tracked_files
 
+    @cache
+    @property
+    def data_file_cache(self):
+        from .store import DataFileCache
+        return DataFileCache()
+
+    def _data_file_summaries(self, xml_files):
+        """Return summaries of ``xml_files``, as ``data_file.summarize()``
+
+        Summaries are kept in the ``data_file_cache``, so that files are
+        only read again when they change, which is done by as many
+        processes as there are CPUs.
+
+        """
+        paths = [os.path.abspath(self.file_path(f)) for f in xml_files]
+        keys = [("summary-2", self.module_name, path) for path in paths]
+        summaries = [self.data_file_cache.get(key, path)
+                     for key, path in zip(keys, paths)]
+        missing = [i for i, summary in enumerate(summaries)
+                   if summary is None]
+        fingerprints = [self.data_file_cache.fingerprint(paths[i])
+                        for i in missing]
+        parsed = data_file.summarize_files([paths[i] for i in missing],
+                                           self.module_name)
+        for i, fingerprint, summary in zip(missing, fingerprints, parsed):
+            self.data_file_cache.set(keys[i], fingerprint, summary)
+            summaries[i] = summary
+        return summaries
+
+    def _data_file_tree(self, filename):
+        """Return the XML tree of tracked ``filename``, parsed on demand"""
+        _, _, tracked_files = self.map_data()
+        dct = tracked_files[filename]
+        if dct["xml_file_content"] is None:
+            dct["xml_file_content"] = load(self.file_path(filename))
+        return dct["xml_file_content"]
+
+    def _tracked_record_xml(self, xmlid):
+        """Return the XML element of tracked ``xmlid``, parsed on demand"""
+        tracked_xml_ids, _, _ = self.map_data()
+        entry = tracked_xml_ids[xmlid]
+        if entry["record_xml"] is None:
+            filename = entry["filename"]
+            tree = self._data_file_tree(filename)
+            for record in data_file.data_records(tree):
+                if 'id' not in record.attrib:
+                    continue
+                other = tracked_xml_ids.get(
+                    self.xmlid2tuple(record.attrib['id']))
+                if other is not None and other["filename"] == filename:
+                    other["record_xml"] = record
+        return entry["record_xml"]
+
+    def _xml_record_deps(self, record):
+        """Return xml_ids used by XML ``record``, and errors met"""
+        return data_file.record_deps(record, self.module_name)
+
     def _record_info(self, record):
         dct = obj2dct(record)
         dct["digest"] = common.ooop_object_digest(record, 50)
@@ -214,7 +289,7 @@ class Command(common.OemCommand):
                 all=None, out="", prefix="",
                 label='%(_model)s_record',
                 fmt='%(id)5s %(name)-40s %(xml_id)-40s',
-                exclude_o2m=None):
+                exclude_o2m=None, jobs=1, render_jobs=1, stream=None):
         """Import records of a given model
 
         Will import records in XML format and dispatch them in files
@@ -229,7 +304,8 @@ class Command(common.OemCommand):
               [--id NID] [--xmlid XMLID]
               [--fields FIELDS]
               [--all | -a]
-              [--exclude-o2m | -x]
+              [--exclude-o2m | -x] [--jobs N | -j N]
+              [--render-jobs N] [--stream]
               [--out OUTFILE | -o OUTFILE] [--prefix OUTDIR]
               [--label TMPL]
               [--fmt TMPL]
@@ -251,6 +327,19 @@ class Command(common.OemCommand):
                              record matches given filters.
             --exclude-o2m, -x
                              Do not recurse in o2m links of target records.
+            --jobs N, -j N   Number of concurrent requests used to read
+                             each level of o2m descendants. Order of
+                             records is the same whatever N is.
+                             (Default is 1)
+            --render-jobs N  Number of processes used to build the XML
+                             of collected records. Worth it only on
+                             exports of thousands of records. New files
+                             are then written along.
+                             (Default is 1)
+            --stream         Process records by small chunks, from
+                             reading to writing, so that memory use does
+                             not grow with the number of records. New
+                             files are written along.
             --label TMPL     Provide template for automatic file name.
                              (Default is '%%(model)s_record')
             --fmt TMPL       Provide template for command line display of
@@ -280,11 +369,24 @@ class Command(common.OemCommand):
                 "    oem db use DEFAULT_DB\n\n")
             exit(1)
 
-        self.initialize(db=db, load_models=True,
-                        interactive="__env__" in args)
+        self.initialize(db=db, interactive="__env__" in args)
+
+        try:
+            self.o.jobs = int(jobs)
+            assert self.o.jobs > 0
+        except (ValueError, AssertionError):
+            msg.die("Invalid value %r for ``--jobs``, "
+                    "a positive integer is expected." % (jobs, ))
+
+        try:
+            self.render_jobs = int(render_jobs)
+            assert self.render_jobs > 0
+        except (ValueError, AssertionError):
+            msg.die("Invalid value %r for ``--render-jobs``, "
+                    "a positive integer is expected." % (render_jobs, ))
 
         if not self.o.model_exists(model):
-            raise Exception("Model %r not found." % (model,))
+            raise Exception(self.o.model_not_found_msg(model))
 
         if xmlid:
             xmlid_tuple = self.xmlid2tuple(xmlid)
@@ -329,12 +431,13 @@ class Command(common.OemCommand):
         self.dispatch_cli_specs = parse_dispatch_specs(out)
         self.prefix = prefix
 
-        self._record_import(l, label, tag, follow_o2m=not exclude_o2m)
+        self._record_import(l, label, tag, follow_o2m=not exclude_o2m,
+                            stream=stream)
 
     def _get_file_name_for_record(self, ooop_record, import_data,
                                   label="%(_model)s_record"):
         model = ooop_record._model
-        dct = obj2dct(ooop_record)
+        dct = obj2dct(ooop_record, self.dispatcher.fields(model))
         dct["_model"] = model[2:] if model.startswith('x_') else model
         destination = self.dispatcher(dct)
         if self.prefix:
@@ -344,14 +447,73 @@ class Command(common.OemCommand):
             kf.mkdir(dirname, recursive=True)
         return destination
 
-    def _record_import(self, ooop_records, label, tag, follow_o2m=True):
+    def _record_import(self, ooop_records, label, tag, follow_o2m=True,
+                       stream=False):
 
-        tracked_xml_ids, _, tracked_files = self.map_data()
+        self.map_data()
 
         print(aformat("Collecting records in %s" % self.db_identifier, attrs=["bold", ]))
-        content = self.to_xml(ooop_records, follow_o2m=follow_o2m, tag=tag)
+        chunk_size = self.record_cache.chunk_size if stream else None
+        content = self.iter_xml(ooop_records, follow_o2m=follow_o2m, tag=tag,
+                                window=chunk_size)
+
+        records_written = []
+        filenames = {}
+        ## new files written along in stream mode
+        writers = {}
+        ## file and deps of each new or changed record
+        changes = {}
+        try:
+            while True:
+                chunk = list(itertools.islice(content, chunk_size))
+                if not chunk:
+                    break
+                print(aformat("Reviewing collected records",
+                              attrs=["bold", ]))
+                ## rendered records are best written as they are
+                self._review_xmls(self._build_xmls(chunk), label, filenames,
+                                  changes,
+                                  writers if stream or self.render_jobs > 1
+                                  else None)
+                records_written.extend((r._model, r._ref)
+                                       for r, _c, _d in chunk)
+                if stream:
+                    self.record_cache.forget([r for r, _c, _d in chunk],
+                                             keep=['name'])
+        except:
+            ## files are left as they were
+            for writer in writers.values():
+                writer.discard()
+            raise
+
+        if filenames or writers:
+            print(aformat("Writing changes", attrs=["bold", ]))
+        else:
+            print(aformat("No changes to write to files.", attrs=["bold", ]))
+
+        for filename in sorted(filenames):
+            self.put_contents(filename, xml2string(filenames[filename]))
+        for filename in sorted(writers):
+            writers[filename].close()
+            self.put_file(filename, writers[filename].filename)
+        self.declare_xml(*sorted(set(filenames) | set(writers)))
+
+        self._trigger_event(records_written, 'write')
 
-        xmls = [(r, xmlize(c), d) for r, c, d in content]
+        self._lint_changes(changes)
+
+    def _review_xmls(self, xmls, label, filenames, changes, writers=None):
+        """Place each xml of ``xmls`` in the content of its file
+
+        Xmls are elements, or ``record_xml.Rendered`` records which are
+        only parsed when they must be placed in an existing file.
+        Changed files are collected in ``filenames``, and the file and
+        deps of new or changed records in ``changes``. When ``writers``
+        is given, records of new files are written at once through a
+        ``DataFileWriter``.
+
+        """
+        tracked_xml_ids, _, tracked_files = self.map_data()
 
         def msg(action, xmlid, filename, record):
             token = aformat("..", fg="black", attrs=["bold", ])
@@ -367,70 +529,70 @@ class Command(common.OemCommand):
                      trunc(self.tuple2xmlid(xmlid), 32, index=8),
                      trunc(filename, 32, index=8),
                      record._model, record._ref,
-                     (": %s" % r.name) if 'name' in r.fields else ''))
+                     (": %s" % record.name) if 'name' in record.fields else ''))
 
-        print(aformat("Reviewing collected records", attrs=["bold", ]))
-        records_written = []
-        filenames = {}
         for record, xml, deps in xmls:
-            records_written.append(record)
             module, xml_id = self.xml_id_mgr.lookup(record)
             ## This is the real xmlid that will be written and should
             ## be checked
             xmlid = self.xmlid2tuple(xml_id)
+            rendered = isinstance(xml, record_xml.Rendered)
             if xmlid in tracked_xml_ids:
-                elt = tracked_xml_ids[xmlid]['record_xml']
-
                 filename = tracked_xml_ids[xmlid]['filename']
-                if xml2string(elt) == xml2string(xml):
+                digest = xml.digest if rendered else common.xml_digest(xml)
+                if tracked_xml_ids[xmlid]['digest'] == digest:
                     msg("nop", xmlid, filename, record)
                     continue
                 msg("chg", xmlid, filename, record)
+                changes[xmlid] = (filename, xml.deps if rendered
+                                  else self._xml_record_deps(xml)[0])
+                if rendered:
+                    xml = xml.element()
                 if filename not in filenames:
-                    filenames[filename] = \
-                        tracked_files[filename]['xml_file_content']
+                    filenames[filename] = self._data_file_tree(filename)
                 ## find 'data' element (parent) of tracked xml
-                elt = tracked_xml_ids[xmlid]['record_xml']
+                elt = self._tracked_record_xml(xmlid)
                 data = elt.getparent()
                 data.replace(elt, xml)
                 tracked_xml_ids[xmlid]['record_xml'] = xml
+                tracked_xml_ids[xmlid]['digest'] = digest
                 tracked_xml_ids[xmlid]['replaced'] = \
                     tracked_xml_ids[xmlid].get('replaced', 0) + 1
             else:
                 filename = self._get_file_name_for_record(record, xmls, label)
                 msg("new", xmlid, filename, record)
+                changes[xmlid] = (filename, xml.deps if rendered
+                                  else self._xml_record_deps(xml)[0])
+                if writers is not None and filename not in tracked_files:
+                    if filename not in writers:
+                        writers[filename] = record_xml.DataFileWriter(
+                            common.temp_path(self.file_path(filename)))
+                    writers[filename].write(xml)
+                    continue
+                if rendered:
+                    xml = xml.element()
                 if filename not in filenames:
                     filenames[filename] = \
-                        tracked_files[filename]['xml_file_content'] \
+                        self._data_file_tree(filename) \
                         if filename in tracked_files else \
                         common._empty_data_xml()
                 ## find 'data' xml element.
                 data = filenames[filename].getchildren()[0]
                 data.append(xml)
 
-        if filenames:
-            print(aformat("Writing changes", attrs=["bold", ]))
-        else:
-            print(aformat("No changes to write to files.", attrs=["bold", ]))
-
-        for filename, data in filenames.items():
-            self.add_xml(filename, xml2string(data))
-
-        for r in records_written:
-            self._trigger_event(r, 'write')
-
-        ## Should probably directly write in the linted form...
-        self.lint(args={"-c": True})
-
     def menu_to_xml(self, menu, xml_id, follow_o2m=False, tags=False):
         content = []
         action = None
         action_xml_id = None
         deps = []
 
-        if menu.action:
-            action = self.o.get_object(*menu.action.split(","))
-            omodel = action.res_model
+        action_model, action_id = menu.action.split(",") \
+                                  if menu.action else (None, None)
+        if action_model and not self.o.model_exists(action_model):
+            print("  !! action of menu %r is ignored: %s"
+                  % (menu.name, self.o.model_not_found_msg(action_model)))
+        elif action_model:
+            action = self.record_cache.get(action_model, action_id)
             lookup_action = self.xml_id_mgr.lookup(action._model, action._ref)
             if lookup_action is None:
                 ## we'll then try to import action also
@@ -521,6 +683,21 @@ class Command(common.OemCommand):
         fields.sort(key=lambda x: order_rank.get(x[0], x[0]))
         return fields
 
+    @cache
+    def get_prefetched_fields_for_model(self, model):
+        """Return list of fields to read when prefetching records
+
+        These are the imported fields, and those needed to display and
+        dispatch records.
+
+        """
+        fields = self.get_fields_for_model(model)
+        model_fields = self.o.get_fields(model)
+        for f in ['name'] + self.dispatcher.fields(model):
+            if f in model_fields and f not in fields:
+                fields = fields + [f]
+        return fields
+
     @cache
     def get_fields_def_for_model(self, model):
         """Return list of fields to import"""
@@ -528,9 +705,61 @@ class Command(common.OemCommand):
             (k, v) for k, v in self.o.get_fields(model).items()
             if k in self.get_fields_for_model(model))
 
+    def _prefetch_xml_ids(self, records):
+        """Resolve in bulk all xml_ids required to render given records
+
+        This covers the records themselves and all the objects they
+        reference through their exported relational fields, so that
+        rendering won't issue one ``ir.model.data`` request per field.
+
+        """
+        model_res_ids = set()
+        for r in records:
+            model_res_ids.add((r._model, r._ref))
+            for f, fdef in self.get_fields_def_for_model(r._model).items():
+                if fdef['ttype'] not in RELATIONAL_TTYPES or \
+                       'function' in fdef:
+                    continue
+                value = getattr(r, f)
+                if not value:
+                    continue
+                if fdef['ttype'] == 'reference':
+                    m, res_id = value.split(',', 1)
+                    model_res_ids.add((m, res_id))
+                elif fdef['ttype'] in ['many2one', 'one2one']:
+                    model_res_ids.add((value._model, value._ref))
+                else:
+                    model_res_ids |= set((v._model, v._ref) for v in value)
+        self.xml_id_mgr.prefetch(model_res_ids)
+
+    def _prefetch_records(self, records):
+        """Read at once records, and all xml_ids needed to render them
+
+        Called along the o2m traversal of ``iter_xml``, so that records
+        are read with a few concurrent requests instead of some per
+        record. Xml_ids of o2m descendants are included, as they are
+        needed to sort them.
+
+        """
+        self.record_cache.prefetch(records)
+        self.record_cache.load()
+        self._prefetch_xml_ids(records)
+
     def to_xml(self, records, follow_o2m=False, tag=False):
+        return list(self.iter_xml(records, follow_o2m=follow_o2m, tag=tag))
 
-        def msg(action, xmlid, record, tags=""):
+    def iter_xml(self, records, follow_o2m=False, tag=False, window=None):
+        """Generate (record, xml, deps) of records and their descendants
+
+        Records are read by ``window`` records following in the
+        traversal, or by whole levels of o2m descendants if not set.
+
+        """
+
+        def describe(r):
+            return (": %s" % r.name) if 'name' in r.fields else ''
+
+        def msg(action, xmlid, (model, res_id), description, tags=""):
             token = aformat("..", fg="black", attrs=["bold", ])
             trunc = lambda s, l, index=-1: shorten(s, l, index=index,
                                                    token=token, token_length=2)
@@ -544,21 +773,31 @@ class Command(common.OemCommand):
             print("  %s: %-56s %-10s (%s,%4d)%s"
                   % (action_colored,
                      trunc(self.tuple2xmlid(xmlid), 64),
-                     tags,
-                     record._model, record._ref,
-                     (": %s" % r.name) if 'name' in r.fields else ''))
+                     tags, model, res_id, description))
 
-        content = []
-        objs = [(record, record._model, getattr(record, 'name', 'anonymous'))
-                for record in records]
-        done = []
+        ## Work on cached records, read along the traversal
+        records = [self.record_cache.get(r._model, r._ref) for r in records]
+        objs = collections.deque(
+            (record, record._model, None, 0) for record in records)
+        done = set()
+        prefetched = set()
 
         while objs:
 
-            (r, model, identifier), objs = objs[0], objs[1:]
+            r, model, identifier, depth = objs.popleft()
 
-            exported_fields = list((k, v) for k, v in r.fields.iteritems()
-                                   if k in self.get_fields_for_model(model))
+            if (r._model, r._ref) not in prefetched:
+                ## without window, queue holds the rest of current level
+                following = [obj for obj, _m, _i, _d in itertools.islice(
+                    objs, 0, None if window is None else window - 1)]
+                self._prefetch_records([r] + following)
+                prefetched.update((obj._model, obj._ref)
+                                  for obj in [r] + following)
+
+            if identifier is None:
+                identifier = getattr(r, 'name', 'anonymous')
+
+            exported_fields = self.get_fields_def_for_model(model).items()
 
             ##
             ## Remove markups (tags) and set xml_id in current database
@@ -568,36 +807,13 @@ class Command(common.OemCommand):
                 ## change only in current lang
                 r.name = remove_tag(r.name, tag)
 
-                def _save(r):
-                    o = self.o._ooop
-                    msg("name", self.xml_id_mgr.lookup(r), r)
-                    lang = o.context.get('lang', 'en_US')
-                    if lang != 'en_US':
-                        old_lang = o.context['lang']
-                        del o.context['lang']
-                        current_name = o.read(r._model, r._ref,
-                                              ['name']).get('name', None)
-                        if current_name is not None:
-                            new_name = remove_tag(current_name, tag)
-                            if new_name != current_name:
-                                o.write(r._model, [r._ref], {'name': new_name})
-                                print("    | rename in %r to %r"
-                                      % ('en_US', new_name))
-                        o.context['lang'] = old_lang
-                    try:
-                        o.write(r._model, [r._ref], {'name': r.name})
-                        print("    | rename in %r to %r"
-                              % (lang, r.name))
-                    except xmlrpclib.Fault, e:
-                        if re.search("^warning -- Constraint Error.*"
-                                     "Language code.*known languages",
-                                     e.faultCode, re.DOTALL):
-                            print("    ! language %r not known."
-                                  % o.context['lang'])
-                        else:
-                            raise
-
-                self._add_callback(r, 'write', _save)
+                def _save(key, name=r.name, description=describe(r)):
+                    msg("name", self.xml_id_mgr.lookup(*key), key,
+                        description)
+                    self._names_to_strip.append(key + (name, tag))
+
+                self._add_callback(r, 'write', _save,
+                                   flush=self._flush_renames)
 
             ## XXXvlab: Warning, nothing is done to ensure uniqueness within
             ## the current XML. Hopefully, names will distinguish them out.
@@ -611,24 +827,26 @@ class Command(common.OemCommand):
                     self.module_name,
                     model, r._ref, remove_tag(identifier, tag))
 
-                def _set_xmlid(r):
-                    lookup = self.xml_id_mgr.lookup(r)
-                    msg("mark", lookup, r)
-                    self.o.set_xml_id(r._model, r._ref, lookup)
-                self._add_callback(r, 'write', _set_xmlid)
+                def _set_xmlid(key, description=describe(r)):
+                    lookup = self.xml_id_mgr.lookup(*key)
+                    msg("mark", lookup, key, description)
+                    self._xml_ids_to_set.append(key + (lookup, ))
+                self._add_callback(r, 'write', _set_xmlid,
+                                   flush=self._flush_xml_ids)
 
             if (module, xml_id) in done:
-                msg("skip", (module, xml_id), r)
+                msg("skip", (module, xml_id), (r._model, r._ref),
+                    describe(r))
                 continue
 
             ##
             ## Generate XML for a record
             ##
-            msg("grab", (module, xml_id), r, "NEW" if new else "")
+            msg("grab", (module, xml_id), (r._model, r._ref), describe(r),
+                "NEW" if new else "")
 
-            content.extend(
-                self.record_to_xml(r, xml_id, follow_o2m=follow_o2m))
-            done.append((module, xml_id))
+            content = self.record_to_xml(r, xml_id, follow_o2m=follow_o2m)
+            done.add((module, xml_id))
             if follow_o2m:
                 ## Add all the one2many:
                 for f, fdef in exported_fields:
@@ -644,9 +862,12 @@ class Command(common.OemCommand):
                         with_xmlids.sort(key=self.xml_id_mgr.get_xml_id_sort_key)
                         print("    + %d o2m descendant along %r attribute"
                               % (len(new_records), f))
-                        objs += [(obj, fdef['relation'], identifier)
-                                 for obj in (with_xmlids + without_xmlids)]
-        return content
+                        objs.extend((obj, fdef['relation'], identifier,
+                                     depth + 1)
+                                    for obj in (with_xmlids + without_xmlids))
+            ## only now, as ``r`` can then be forgotten by the consumer
+            for c in content:
+                yield c
 
     def record_to_xml(self, record, xml_id, follow_o2m=None):
         content = []
@@ -657,14 +878,63 @@ class Command(common.OemCommand):
                 record, xml_id,
                 follow_o2m=follow_o2m))
         else:
-            content.extend(self._render_record_template(record, model, xml_id))
+            content.extend(self._render_record(record, model, xml_id))
 
         return content
 
+    @cache
+    @property
+    def record_template(self):
+        """Mako template overriding the native record builder, if any
+
+        Set ``rec.import.template`` to ``default`` to use the template
+        shipped with oem, or to the path of your own template.
+
+        """
+        template = mdict.mdict(self.cfg).get("rec.import.template", None)
+        if template is None:
+            return None
+        if template == "default":
+            return T / "xml" / "record.xml"
+        return tmpl.mk(kf.get_contents(os.path.expanduser(template)))
+
+    def _render_record(self, r, model, xml_id):
+        if self.record_template is not None:
+            return self._render_record_template(r, model, xml_id)
+        items, deps = record_xml.snapshot(
+            r, self.get_fields_def_for_model(model).items(),
+            self.xml_id_mgr, self.db_identifier)
+        return [(r, record_xml.Snapshot(xml_id, model, items), deps)]
+
+    def _build_xmls(self, content):
+        """Return (record, xml, deps) of collected ``content``
+
+        Templates output are parsed, and record snapshots are built in
+        process. With more than one ``render_jobs``, snapshots are
+        rather rendered by as many processes, and come as
+        ``record_xml.Rendered`` records which are only parsed if needed.
+
+        """
+        if self.render_jobs > 1:
+            tracked_xml_ids, _, _ = self.map_data()
+            snapshots = [c for _r, c, _d in content
+                         if isinstance(c, record_xml.Snapshot)]
+            ## only existing records are compared
+            rendered = iter(record_xml.render_records(
+                snapshots, self.module_name, jobs=self.render_jobs,
+                digests=[self.xmlid2tuple(s.xml_id) in tracked_xml_ids
+                         for s in snapshots]))
+            build = lambda snapshot: next(rendered)
+        else:
+            build = lambda snapshot: record_xml.build_record(*snapshot)
+        return [(r, build(c) if isinstance(c, record_xml.Snapshot)
+                    else xmlize(c), d)
+                for r, c, d in content]
+
     def _render_record_template(self, r, model, xml_id):
         deps = []
         ## XXXvlab: couldn't we remove ``model`` in favor of r._model ?
-        return [(r, tmpl.render(T / "xml" / "record.xml",
+        return [(r, tmpl.render(self.record_template,
                                 r=r, fields=self.get_fields_def_for_model(model).items(),
                                 model=model,
                                 xml_id=xml_id,
@@ -673,7 +943,15 @@ class Command(common.OemCommand):
                                 deps=deps), deps)]
 
     ## XXXvlab: should be a method of an ooop.Data adapter
-    def _add_callback(self, r, event, callback):
+    def _add_callback(self, r, event, callback, flush=None):
+        """Register ``callback(key)`` to be called upon ``event`` on ``r``
+
+        ``key`` is the (model, id) of ``r``, as records themselves are not
+        kept until the event. ``flush`` is called once after all callbacks
+        of an event triggered on several records, and allows callbacks to
+        only queue their work for it to be done in bulk.
+
+        """
         if not hasattr(self, 'cbs'):
             self.cbs = {}
 
@@ -687,14 +965,103 @@ class Command(common.OemCommand):
         if event not in record_events:
             record_events[event] = []
 
-        record_events[event].append((r, callback))
+        record_events[event].append((callback, flush))
 
     ## XXXvlab: should be a method of an ooop.Data adapter
-    def _trigger_event(self, r, event):
-        key = (r._model, r._ref)
-        events = getattr(self, "cbs", {}).get(key, {}).get(event, [])
-        for r, ev in events:
-            ev(r)
+    def _trigger_event(self, keys, event):
+        """Call callbacks of ``event`` of records of (model, id) ``keys``"""
+        flushes = []
+        for key in keys:
+            events = getattr(self, "cbs", {}).get(key, {}).get(event, [])
+            for ev, flush in events:
+                ev(key)
+                if flush is not None and flush not in flushes:
+                    flushes.append(flush)
+        for flush in flushes:
+            flush()
+
+    @cache
+    @property
+    def _names_to_strip(self):
+        return []
+
+    def _flush_renames(self):
+        """Write names stripped of their tag queued by ``_save``
+
+        Names are written in current language, and also in ``en_US`` if
+        it is not the current language. Records of a same model getting
+        the same name are written at once.
+
+        """
+        entries = self._names_to_strip[:]
+        del self._names_to_strip[:]
+        context = dict(self.o.context)
+        lang = context.get('lang', 'en_US')
+
+        if lang != 'en_US':
+            ## without lang, server reads and writes in en_US
+            en_context = dict(context)
+            del en_context['lang']
+            ids_by_model = collections.defaultdict(list)
+            tags = {}
+            for model, res_id, _name, tag in entries:
+                ids_by_model[model].append(res_id)
+                tags[(model, res_id)] = tag
+            with self.o.batch() as batch:
+                reads = [(model, batch.execute(model, "read", ids, ['name'],
+                                               en_context))
+                         for model, ids in ids_by_model.items()]
+            renames = []
+            for model, read in reads:
+                for value in read.value:
+                    if not value.get('name'):
+                        continue
+                    new_name = remove_tag(value['name'],
+                                          tags[(model, value['id'])])
+                    if new_name != value['name']:
+                        renames.append((model, value['id'], new_name))
+            self._write_names(renames, 'en_US', en_context)
+
+        self._write_names([(model, res_id, name)
+                           for model, res_id, name, _tag in entries],
+                          lang, context)
+
+    def _write_names(self, renames, lang, context):
+        """Write names given as (model, res_id, name), grouped by value"""
+        ids_by_value = collections.OrderedDict()
+        for model, res_id, name in renames:
+            ids_by_value.setdefault((model, name), []).append(res_id)
+        with self.o.batch() as batch:
+            writes = [(model, name, ids,
+                       batch.execute(model, "write", ids, {'name': name},
+                                     context))
+                      for (model, name), ids in ids_by_value.items()]
+        for model, name, ids, write in writes:
+            try:
+                write.value
+            except xmlrpclib.Fault, e:
+                if re.search("^warning -- Constraint Error.*"
+                             "Language code.*known languages",
+                             e.faultCode, re.DOTALL):
+                    print("    ! language %r not known." % lang)
+                    return
+                raise
+            print("    | rename %d %s in %r to %r"
+                  % (len(ids), model, lang, name))
+
+    @cache
+    @property
+    def _xml_ids_to_set(self):
+        return []
+
+    def _flush_xml_ids(self):
+        """Create in database all xml_ids queued by ``_set_xmlid``"""
+        entries = self._xml_ids_to_set[:]
+        del self._xml_ids_to_set[:]
+        for (model, res_id, lookup), e in self.o.set_xml_ids(entries):
+            print("  !! could not mark %s on (%s,%d): %s"
+                  % (self.tuple2xmlid(lookup), model, res_id,
+                     e.faultCode.strip().split("\n")[0]))
 
     @cmd
     def defs(self, dbs, model):
@@ -713,26 +1080,32 @@ class Command(common.OemCommand):
 
         """
         dbs = dbs.split("..") if ".." in dbs else [dbs]
-        ooops = [self.db[db].ooop(load_models=True, interactive=True)
+        ooops = [self.db[db].ooop(interactive=True)
                  for db in dbs]
 
-        ooop_model_name = ooop_normalize_model_name(model)
-        mgrs = [getattr(ooop._ooop, ooop_model_name, False) for ooop in ooops]
-        if any(mgr is False for mgr in mgrs):
-            for db, mgr in zip(dbs, mgrs):
-                if mgr is False:
-                    msg.err('model %r is not found in %r.' % (model, db))
+        if not all(ooop.model_exists(model) for ooop in ooops):
+            for db, ooop in zip(dbs, ooops):
+                if not ooop.model_exists(model):
+                    msg.err('%s (in %r)'
+                            % (ooop.model_not_found_msg(model), db))
             exit(1)
 
-        all_field_defs = [mgr.fields_get() for mgr in mgrs]
+        ## work on copies as ``get_fields`` results are shared
+        all_field_defs = [
+            dict((k, dict(v, type=v["ttype"]))
+                 for k, v in ooop.get_fields(model).iteritems())
+            for ooop in ooops]
         ## Get the common max len
         max_len_name = 1 + max([0] + [len(name)
                                       for field_defs in all_field_defs
                                       for name in field_defs])
 
-        all_columns = [ooop.get_all_d("ir.model.fields",
-                                      [('model', '=', model)])
-                       for ooop in ooops]
+        all_columns = []
+        for ooop in ooops:
+            with ooop.batch() as batch:
+                all_columns.append(batch.search_read(
+                    "ir.model.fields", [('model', '=', model)]))
+        all_columns = [columns.value for columns in all_columns]
         for columns, field_defs in zip(all_columns, all_field_defs):
             for k, field_def in field_defs.iteritems():
                 field_def["ttype"] = ("function(%s)" % field_def["type"]) \
@@ -807,45 +1180,109 @@ class Command(common.OemCommand):
 
         """
 
-        def msg(action, message):
-            token = aformat("..", fg="black", attrs=["bold", ])
-            trunc = lambda s, l, index=-1: shorten(s, l, index=index,
-                                                   token=token, token_length=2)
-            color = {"lint": {"fg": "red"},
-                     "info": {"fg": "white"},
-                     "warn": {"fg": "yellow"},
-                     }
-            action_colored = aformat(action, **color[action])
-            print("  %-4s: %-72s"
-                  % (action_colored, trunc(message, 72, index=-1)))
-
         tracked_xml_ids, mapped_depends, tracked_files = self.map_data()
 
         ## Add file level deps
 
         for f, dct in tracked_files.iteritems():
-            dct["file_deps"] = set(tracked_xml_ids[d]["filename"]
-                                   for d in dct["deps"]
-                                   if d in tracked_xml_ids and
-                                      tracked_xml_ids[d]["filename"] != f)
+            dct["file_deps"] = self._file_deps(f)
 
-        ## Re-order data files ?
+        self._lint_data_order(correct=args['-c'])
+        self._lint_depends(mapped_depends, correct=args['-c'])
 
+    def _lint_changes(self, changes):
+        """Lint and correct the module after the import of ``changes``
+
+        ``changes`` gives the file and deps of each new or changed
+        record. Only file deps that could have changed are computed,
+        and the data files are re-ordered only if one of them isn't
+        satisfied.
+
+        """
+        tracked_xml_ids, mapped_depends, tracked_files = self.map_data()
+        new_xml_ids = set(x for x in changes if x not in tracked_xml_ids)
+        changed_files = set()
+        for xmlid, (filename, deps) in changes.items():
+            if filename not in tracked_files:
+                tracked_files[filename] = {
+                    'xml_file_content': None,
+                    'xml_ids': [],
+                }
+            if xmlid in new_xml_ids:
+                tracked_xml_ids[xmlid] = {'filename': filename,
+                                          'record_xml': None}
+                tracked_files[filename]['xml_ids'].append(xmlid)
+            tracked_xml_ids[xmlid]['deps'] = deps
+            changed_files.add(filename)
+            mapped_depends.extend(m for m, _name in deps
+                                  if m != self.module_name and
+                                     m not in mapped_depends)
+
+        for f in changed_files:
+            tracked_files[f]["deps"] = set().union(
+                *[tracked_xml_ids[x]["deps"]
+                  for x in tracked_files[f]["xml_ids"]])
+        ## files that used xml_ids that are now defined
+        if new_xml_ids:
+            changed_files |= set(f for f, dct in tracked_files.items()
+                                 if dct["deps"] & new_xml_ids)
+
+        position = dict((f, i) for i, f in enumerate(self.meta["data"]))
+        misplaced = False
+        for f in changed_files:
+            tracked_files[f]["file_deps"] = self._file_deps(f)
+            misplaced |= any(position.get(d, -1) > position.get(f, -1)
+                             for d in tracked_files[f]["file_deps"])
+        if misplaced:
+            for f, dct in tracked_files.iteritems():
+                if "file_deps" not in dct:
+                    dct["file_deps"] = self._file_deps(f)
+            self._lint_data_order(correct=True)
+
+        self._lint_depends(mapped_depends, correct=True)
+
+    def _lint_msg(self, action, message):
+        token = aformat("..", fg="black", attrs=["bold", ])
+        trunc = lambda s, l, index=-1: shorten(s, l, index=index,
+                                               token=token, token_length=2)
+        color = {"lint": {"fg": "red"},
+                 "info": {"fg": "white"},
+                 "warn": {"fg": "yellow"},
+                 }
+        action_colored = aformat(action, **color[action])
+        print("  %-4s: %-72s"
+              % (action_colored, trunc(message, 72, index=-1)))
+
+    def _file_deps(self, filename):
+        """Return data files defining xml_ids used in ``filename``"""
+        tracked_xml_ids, _, tracked_files = self.map_data()
+        return set(tracked_xml_ids[d]["filename"]
+                   for d in tracked_files[filename]["deps"]
+                   if d in tracked_xml_ids and
+                      tracked_xml_ids[d]["filename"] != filename)
+
+    def _lint_data_order(self, correct=False):
+        """Re-order data files of metadata according to their deps
+
+        Requires ``file_deps`` of all tracked files.
+
+        """
+        _, _, tracked_files = self.map_data()
         get_deps = lambda f: tracked_files.get(
             f, {"deps": [], "file_deps": set()})["file_deps"]
         orig_data = self.meta["data"]
         new_data = reorder(orig_data[:], get_deps)
         if orig_data != new_data:
-            if not args['-c']:
-                msg("warn", "XML data file loading order issue found.")
+            if not correct:
+                self._lint_msg("warn", "XML data file loading order issue found.")
                 print("          use ``-c`` to correct them automatically")
             else:
                 with self.meta as meta:
                     meta["data"] = new_data
-                    msg("lint", "corrected order of data section.")
-
-        ## check module deps
+                    self._lint_msg("lint", "corrected order of data section.")
 
+    def _lint_depends(self, mapped_depends, correct=False):
+        """Check modules used by data files are in the metadata depends"""
         set_meta_depends = set(self.meta["depends"])
         ## XXXvlab: until we now how to read python, and collect python deps,
         ## this won't work. The following code will removed unused detection
@@ -855,8 +1292,8 @@ class Command(common.OemCommand):
         if set_meta_depends != set_mapped_depends:
             missing = set_mapped_depends - set_meta_depends
             unused = set_meta_depends - set_mapped_depends
-            if not args['-c']:
-                msg("warn", "Module depencies issues found:")
+            if not correct:
+                self._lint_msg("warn", "Module depencies issues found:")
                 if missing:
                     print("          ! missing module: %s"
                           % (", ".join(sorted(missing))))
@@ -871,5 +1308,5 @@ class Command(common.OemCommand):
                     meta["depends"] = sorted(set_mapped_depends)
                     message = ",".join(["-%s" % m for m in sorted(unused)] +
                                        ["+%s" % m for m in sorted(missing)])
-                    msg("lint", "modified depends list. (%s)" % message)
+                    self._lint_msg("lint", "modified depends list. (%s)" % message)
 
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Concurrent access to several databases
+
+``AsyncOOOPExtended`` wraps an ``OOOPExtended`` and returns a ``Future``
+instead of blocking on each call. All calls are run by an ``Executor``
+which can be shared by connections to many databases, while limiting
+the number of calls in flight on each server::
+
+    executor = Executor(workers=64, per_server=4)
+    dbs = [AsyncOOOPExtended(oe, executor) for oe in connections]
+    versions = [db.version() for db in dbs]      ## all sent at once
+    print([v.get() for v in versions])
+
+Calls of a same server are started in the order they were submitted:
+
+    >>> executor = Executor(workers=4, per_server=2)
+    >>> futures = [executor.submit("srv", pow, 2, i) for i in range(5)]
+    >>> [f.get() for f in futures]
+    [1, 2, 4, 8, 16]
+
+Exceptions are raised by ``get()``:
+
+    >>> executor.submit("srv", int, "a").get()
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid literal for int() with base 10: 'a'
+
+"""
+
+import sys
+import threading
+import collections
+
+from multiprocessing.pool import ThreadPool
+
+from kids.cache import cache
+
+
+class Future(object):
+    """Result of a call that will be available later"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+        self._exc_info = None
+
+    def set_result(self, value):
+        self._value = value
+        self._event.set()
+
+    def set_exception(self, exc_info):
+        self._exc_info = exc_info
+        self._event.set()
+
+    def ready(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+
+    def get(self, timeout=None):
+        """Return the result, waiting for it if needed"""
+        self.wait(timeout)
+        if not self.ready():
+            raise threading.ThreadError("Timeout while waiting result.")
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+
+
+class Executor(object):
+    """Runs calls on a pool of threads, limiting them per server
+
+    At most ``per_server`` calls of a same server are running at once,
+    others wait in a queue without holding any thread of the pool.
+
+    """
+
+    def __init__(self, workers=32, per_server=4):
+        self.pool = ThreadPool(workers)
+        self.per_server = per_server
+        self._queues = collections.defaultdict(collections.deque)
+        self._running = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    def submit(self, server, func, *args, **kwargs):
+        """Return a ``Future`` of ``func(*args, **kwargs)`` run on server"""
+        future = Future()
+        with self._lock:
+            self._queues[server].append((future, func, args, kwargs))
+            start = self._running[server] < self.per_server
+            if start:
+                self._running[server] += 1
+        if start:
+            self._next(server)
+        return future
+
+    def _next(self, server):
+        with self._lock:
+            queue = self._queues[server]
+            if not queue:
+                self._running[server] -= 1
+                return
+            call = queue.popleft()
+        self.pool.apply_async(self._run, (server, ) + call)
+
+    def _run(self, server, future, func, args, kwargs):
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception:
+            future.set_exception(sys.exc_info())
+        self._next(server)
+
+
+@cache
+def default_executor():
+    return Executor()
+
+
+class AsyncOOOPExtended(object):
+    """``OOOPExtended`` whose calls return a ``Future``
+
+    Connections to a same server share their limit of calls in flight
+    when they share their ``executor``.
+
+    """
+
+    def __init__(self, oe, executor=None):
+        self.oe = oe
+        self.executor = executor or default_executor()
+        self.server = (oe._ooop.uri, oe._ooop.port)
+
+    def _submit(self, method, *args, **kwargs):
+        return self.executor.submit(self.server, getattr(self.oe, method),
+                                    *args, **kwargs)
+
+    def version(self):
+        return self._submit("version")
+
+    def get_fields(self, model):
+        return self._submit("get_fields", model)
+
+    def get_all_d(self, model, domain, order=None, limit=None, offset=0,
+                  fields=[]):
+        return self._submit("get_all_d", model, domain, order=order,
+                            limit=limit, offset=offset, fields=fields)
+
+    def get_xml_id(self, model, object_id):
+        return self._submit("get_xml_id", model, object_id)
+
+    def set_xml_id(self, model, object_id, xml_id):
+        return self._submit("set_xml_id", model, object_id, xml_id)
+
+    def write(self, *args, **kwargs):
+        return self._submit("write", *args, **kwargs)
@@ -1,15 +1,24 @@
 
 import xmlrpclib
+import hashlib
+import difflib
+import collections
 import ooop
 
+from multiprocessing.pool import ThreadPool
+
 from datetime import timedelta
 from sact.epoch import Time, TzLocal, UTC
 from kids.cache import cache
 
+from . import jsonrpc
+
 OOOP_NAME_TAG_LIKE_EXPR = "{%s}%%"
 
 LoginFailed = ooop.LoginFailed
 
+_NOT_SENT = object()
+
 
 ## XXXvlab: should propose a modification to OOOP code to get this
 ##  function accessible outside from an instanced object.
@@ -31,10 +40,14 @@ def tuple2xmlid((module, local_id), default_module=None):
         return "%s.%s" % (module, local_id)
 
 
-def obj2dct(obj):
-    """Gets simple displayable fields of obj in a dict"""
+def obj2dct(obj, fields=None):
+    """Gets simple displayable fields of obj in a dict
+
+    Only ``fields`` are read if given.
+
+    """
     dct = dict((k, getattr(obj, k)) for k, d in obj.fields.iteritems()
-               if "2" not in d['ttype'])
+               if "2" not in d['ttype'] and (fields is None or k in fields))
     dct["id"] = obj._ref
     return dct
 
@@ -115,15 +128,370 @@ def build_filters(opt_filters):
     return filters
 
 
+class OOOP(ooop.OOOP):
+    """OOOP with lazy model registry that can reuse a previous session
+
+    Model proxies are not built at connection time, but upon first
+    access of their CamelCased attribute, which requires only the list
+    of model names.
+
+    ``session`` is a dict as returned by ``OOOPExtended.session()``. If it
+    is still valid, login and fetching model names will be skipped. Its
+    model catalog is only used once the session is validated, and if
+    ``models_check`` (when given) tells it is still current on first use
+    of the catalog. It is dropped by ``reload_models()``.
+
+    ``transport`` is the ``xmlrpclib.Transport`` shared by all server
+    proxies, as a ``transport.PooledTransport`` to reuse connections (or
+    a ``jsonrpc.JsonRpcTransport`` when ``protocol`` is ``"jsonrpc"``).
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._session = kwargs.pop("session", None)
+        self._transport = kwargs.pop("transport", None)
+        self._models_check = kwargs.pop("models_check", None)
+        self._models = None
+        ## catalog of a valid session, not checked yet
+        self._session_models = None
+        self._normalized = None
+        ooop.OOOP.__init__(self, *args, **kwargs)
+
+    def server_proxy(self, service):
+        """Return a ServerProxy on given service
+
+        With ``protocol="jsonrpc"``, the service is reached through Odoo's
+        ``/jsonrpc`` endpoint instead of ``/xmlrpc/<service>``.
+
+        """
+        if self.protocol == "jsonrpc":
+            return jsonrpc.ServerProxy(
+                '%s:%i/jsonrpc' % (self.uri, self.port), service,
+                transport=self._transport)
+        return xmlrpclib.ServerProxy(
+            '%s:%i/xmlrpc/%s' % (self.uri, self.port, service),
+            transport=self._transport)
+
+    def connect(self):
+        self.uid = self.login(self.dbname, self.user, self.pwd)
+        self.objectsock = self.server_proxy("object")
+        self.reportsock = self.server_proxy("report")
+
+    def login(self, dbname, user, pwd):
+        if self._session is not None:
+            uid = self._session["uid"]
+            objectsock = self.server_proxy("object")
+            ## any call checks credentials, this one reads nothing and,
+            ## unlike a login, doesn't write the login date of the user.
+            try:
+                objectsock.execute(dbname, uid, pwd, "res.users",
+                                   "check_access_rights", "read", False)
+                valid = True
+            except xmlrpclib.Fault:
+                valid = False
+            if valid:
+                self.commonsock = self.server_proxy("common")
+                for k, v in self._session.get("context", {}).iteritems():
+                    getattr(self, "context", {}).setdefault(k, v)
+                if isinstance(self._session.get("models"), dict):
+                    self._session_models = self._session["models"]
+                return uid
+            self._session = None
+        self.commonsock = self.server_proxy("common")
+        uid = self.commonsock.login(dbname, user, pwd)
+        if not uid:
+            raise LoginFailed("Login as %r on %r failed." % (user, dbname))
+        return uid
+
+    def load_models(self):
+        """Models are registered lazily (see ``__getattr__``)"""
+
+    def model_catalog(self):
+        """Return a dict of all models of the database by name
+
+        Each model is described by a dict with its ``transient`` flag and
+        the list of ``modules`` declaring it (when the server provides
+        them).
+
+        """
+        if self._models is None:
+            models, self._session_models = self._session_models, None
+            if models is not None and \
+                   (self._models_check is None or self._models_check()):
+                self._models = models
+        if self._models is None:
+            available = self.execute(ooop.OOOPMODELS, "fields_get", [])
+            fields = ["model"] + [f for f in ["transient", "osv_memory",
+                                              "modules"]
+                                  if f in available]
+            ids = self.execute(ooop.OOOPMODELS, "search", [])
+            self._models = {}
+            for m in self.execute(ooop.OOOPMODELS, "read", ids, fields):
+                self._models[m["model"]] = {
+                    "transient": bool(m.get("transient",
+                                            m.get("osv_memory", False))),
+                    "modules": [name.strip() for name in
+                                (m.get("modules") or "").split(",")
+                                if name.strip()],
+                }
+        return self._models
+
+    def reload_models(self):
+        """Forget the model catalog, for it to be loaded again"""
+        self._models = None
+        self._session_models = None
+        self._normalized = None
+
+    def model_names(self):
+        """Return the list of all model names of the database"""
+        return sorted(self.model_catalog())
+
+    def _normalized_model_names(self):
+        if self._normalized is None:
+            self._normalized = dict((self.normalize_model_name(m), m)
+                                    for m in self.model_names())
+        return self._normalized
+
+    def __getattr__(self, label):
+        ## Only CamelCased names can be models
+        if not label[:1].isupper():
+            raise AttributeError(label)
+        model = self._normalized_model_names().get(label)
+        if model is None:
+            raise AttributeError(label)
+        self.models[model] = {"model": model}
+        manager = ooop.Manager(model, self)
+        self.__dict__[label] = manager
+        return manager
+
+
+class BatchResult(object):
+    """Result of a call queued in a ``Batch``
+
+    ``value`` is available once the batch was sent, and will raise the
+    ``xmlrpclib.Fault`` the call has failed with, if any.
+
+    """
+
+    def __init__(self):
+        self._value = _NOT_SENT
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        if self._value is _NOT_SENT:
+            raise RuntimeError("Batch was not sent yet.")
+        if isinstance(self._value, xmlrpclib.Fault):
+            raise self._value
+        return self._value
+
+
+class Batch(object):
+    """Queue independent calls to send them together
+
+    Queued calls are sent as ``system.multicall`` requests when the server
+    supports it, falling back to sending them one after the other.
+    Leaving the context sends any remaining queued calls::
+
+        with oe.batch() as batch:
+            ids = batch.execute("res.partner", "search", [])
+            users = batch.search_read("res.users", [], ["login"])
+        print(ids.value, users.value)
+
+    With ``jobs`` greater than 1, queued calls are split in up to ``jobs``
+    parts sent concurrently.
+
+    """
+
+    def __init__(self, oe, size=100, jobs=1):
+        self.oe = oe
+        self.size = size
+        self.jobs = jobs
+        self._calls = []
+
+    def execute(self, model, *args):
+        result = BatchResult()
+        self._calls.append(((model, ) + args, result))
+        if len(self._calls) >= self.size:
+            self.flush()
+        return result
+
+    def search_read(self, model, domain, fields=[], order=None, limit=None):
+        """Queue a ``OOOPExtended.search_read``
+
+        Old servers lacking ``search_read`` need 2 dependent calls, which
+        are then sent immediately.
+
+        """
+        if self.oe.version() < (8, ):
+            result = BatchResult()
+            result.set(self.oe.search_read(model, domain, fields,
+                                           order=order, limit=limit))
+            return result
+        return self.execute(model, "search_read", domain, fields,
+                            0, limit or False, order or False)
+
+    def flush(self):
+        calls, self._calls = self._calls, []
+        if not calls:
+            return
+        if self.jobs > 1 and len(calls) > 1:
+            if self.oe.multicall is None:
+                ## find out multicall support before going concurrent
+                self._send(calls[:1])
+                calls = calls[1:]
+            step = -(-len(calls) // self.jobs)
+            parts = [calls[i:i + step] for i in range(0, len(calls), step)]
+            pool = ThreadPool(len(parts))
+            try:
+                pool.map(self._send, parts)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            self._send(calls)
+
+    def _send(self, calls):
+        if self.oe.multicall is not False:
+            o = self.oe._ooop
+            try:
+                values = o.objectsock.system.multicall([
+                    {"methodName": "execute",
+                     "params": [o.dbname, o.uid, o.pwd] + list(args)}
+                    for args, _result in calls])
+                self.oe.multicall = True
+            except xmlrpclib.Fault:
+                if self.oe.multicall:
+                    raise
+                ## Not supported by server
+                self.oe.multicall = False
+            else:
+                for (_args, result), value in zip(calls, values):
+                    result.set(xmlrpclib.Fault(**value)
+                               if isinstance(value, dict) else value[0])
+                return
+        for args, result in calls:
+            try:
+                result.set(self.oe._ooop.execute(*args))
+            except xmlrpclib.Fault as e:
+                result.set(e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.flush()
+
+
 class OOOPExtended(object):
     """Adds some shortcuts to ooop"""
 
+    ## Is ``system.multicall`` supported by the server ? (None if unknown)
+    multicall = None
+
+    ## Number of concurrent requests a batch can send
+    jobs = 1
+
+    ## Was the model catalog loaded again after a miss ?
+    _models_reloaded = False
+
     def __init__(self, *args, **kwargs):
-        self._ooop = ooop.OOOP(*args, **kwargs)
+        self.fields_cache = kwargs.pop("fields_cache", None)
+        self._ooop = OOOP(*args, models_check=self._session_is_current,
+                          **kwargs)
+        if self._ooop.protocol == "jsonrpc":
+            ## ``/jsonrpc`` has no ``system.multicall``
+            self.multicall = False
+
+    def _session_is_current(self):
+        """Tell if server and models didn't change since session was saved"""
+        session = self._ooop._session
+        return tuple(session.get("version") or ()) == self.version() and \
+               session.get("fingerprint") == self.schema_fingerprint()
+
+    @property
+    def context(self):
+        """Context sent along OOOP calls"""
+        return getattr(self._ooop, "context", None) or \
+               {"lang": self._ooop.lang}
+
+    def batch(self, size=100, jobs=None):
+        """Return a ``Batch`` to send several independent calls at once"""
+        return Batch(self, size=size, jobs=jobs or self.jobs)
+
+    def connection_stats(self):
+        """Return counters of the connection pool, if any
+
+        ``opened`` and ``reused`` connections, and total ``requests``.
+
+        """
+        transport = self._ooop._transport
+        return dict(getattr(transport, "stats", {}))
+
+    def session(self):
+        """Return session information to reuse it in a later connection
+
+        The model catalog is only saved if it was used, along with the
+        server version and schema fingerprint to check it against. A
+        catalog of the previous session that wasn't used is kept as is.
+
+        """
+        o = self._ooop
+        session = {
+            "uid": o.uid,
+            "context": dict(getattr(o, "context", {})),
+        }
+        previous = o._session or {}
+        if o._session_models is not None or \
+               (o._models is not None and o._models is previous.get("models")):
+            for key in ["version", "fingerprint", "models"]:
+                session[key] = previous.get(key)
+        elif o._models is not None:
+            session.update({
+                "version": self.version(),
+                "fingerprint": self.schema_fingerprint(),
+                "models": o._models,
+            })
+        return session
+
+    def model_catalog(self):
+        """Return description of all models of the database by name
+
+        It is loaded once, and kept along the session as long as the
+        ``schema_fingerprint()`` doesn't change.
+
+        """
+        return self._ooop.model_catalog()
 
     def model_exists(self, model):
-        """Return true if model exists in distant OOOP database"""
-        return len(self._ooop.search("ir.model", [], limit=1)) != 0
+        """Return true if model exists in distant OOOP database
+
+        The first unknown model makes the catalog load again, in case the
+        model was created since.
+
+        """
+        if model in self.model_catalog():
+            return True
+        if not self._models_reloaded:
+            self._models_reloaded = True
+            self._ooop.reload_models()
+        return model in self.model_catalog()
+
+    def similar_models(self, model, count=3):
+        """Return names of existing models close to ``model``"""
+        return difflib.get_close_matches(model, self.model_catalog().keys(),
+                                         count)
+
+    def model_not_found_msg(self, model):
+        """Return error message for unknown ``model`` with suggestions"""
+        similar = self.similar_models(model)
+        return "Model %r not found.%s" % (
+            model,
+            (" Did you mean %s ?" % ", ".join(repr(m) for m in similar))
+            if similar else "")
 
     @cache
     def get_model(self, model):
@@ -141,17 +509,47 @@ class OOOPExtended(object):
         if model in self._ooop.fields.keys():
             return self._ooop.fields[model]
 
-        odoo_fields = self.get_model(model).fields_get()
-        fields = {}
-        for field_name, field in odoo_fields.items():
-            field['name'] = field_name
-            field['relation'] = field.get('relation', False)
-            field['ttype'] = field['type']
-            del field['type']
-            fields[field_name] = field
+        fields = None
+        if self.fields_cache is not None:
+            fields = self.fields_cache.get(model, self.version(),
+                                           self.schema_fingerprint())
+        if fields is None:
+            odoo_fields = self.get_model(model).fields_get()
+            fields = {}
+            for field_name, field in odoo_fields.items():
+                field['name'] = field_name
+                field['relation'] = field.get('relation', False)
+                field['ttype'] = field['type']
+                del field['type']
+                fields[field_name] = field
+            if self.fields_cache is not None:
+                self.fields_cache.set(model, fields, self.version(),
+                                      self.schema_fingerprint())
         self._ooop.fields[model] = fields
         return fields
 
+    @cache
+    def schema_fingerprint(self):
+        """Return a digest identifying the current state of models schema
+
+        It changes whenever a field definition is written or the set of
+        installed modules changes, and is meant to invalidate cached
+        ``fields_get`` results.
+
+        """
+        last_written = self.search_read(
+            "ir.model.fields", [], fields=["write_date"],
+            order="write_date desc", limit=1)
+        modules = self.search_read(
+            "ir.module.module", [("state", "=", "installed")],
+            fields=["name", "latest_version"])
+        digest = hashlib.sha1()
+        digest.update(repr(last_written[0]["write_date"]
+                           if last_written else None))
+        digest.update(repr(sorted((m["name"], m["latest_version"])
+                                  for m in modules)))
+        return digest.hexdigest()
+
     def get_object(self, model, object_id):
         """Return OOOP Instance object using OpenERP model name
 
@@ -197,6 +595,40 @@ class OOOPExtended(object):
         lookup = lookup[0]
         return lookup.module, lookup.name
 
+    def get_xml_ids(self, model_res_ids, chunk_size=1000):
+        """Return dict of module, xml_id of given objects by (res_id, model)
+
+        This is the bulk version of ``get_xml_id``: ``model_res_ids`` is an
+        iterable of (model, res_id), and only one ``ir.model.data`` query
+        per model and chunk of ``chunk_size`` objects is issued, all of them
+        sent in one batch.
+
+        Objects without xml_id are associated to None.
+
+        """
+        res = dict(((int(res_id), model), None)
+                   for model, res_id in model_res_ids)
+        ids_by_model = collections.defaultdict(list)
+        for res_id, model in sorted(res):
+            ids_by_model[model].append(res_id)
+        queries = []
+        with self.batch() as batch:
+            for model, ids in ids_by_model.iteritems():
+                size = min(chunk_size, -(-len(ids) // batch.jobs))
+                for i in range(0, len(ids), size):
+                    queries.append(batch.search_read(
+                        "ir.model.data",
+                        [("model", "=", model),
+                         ("res_id", "in", ids[i:i + size])],
+                        fields=["module", "name", "model", "res_id"]))
+        for query in queries:
+            for lookup in query.value:
+                key = (lookup["res_id"], lookup["model"])
+                ## keep the first one as ``get_xml_id`` does
+                if res[key] is None:
+                    res[key] = lookup["module"], lookup["name"]
+        return res
+
     ## XXXvlab: should be a method of an OOOP object instance
     def set_xml_id(self, model, object_id, (module, xml_id)):
         imd = self.get_model("ir.model.data")
@@ -204,6 +636,43 @@ class OOOPExtended(object):
         ir_model_data.model = model
         ir_model_data.save()
 
+    def set_xml_ids(self, entries, chunk_size=100):
+        """Create xml_ids of several objects at once
+
+        This is the bulk version of ``set_xml_id``: ``entries`` is a list
+        of (model, res_id, (module, xml_id)). Chunks of ``chunk_size``
+        entries are created in one call on servers supporting it (odoo >=
+        12), otherwise in one batch of calls.
+
+        Returns a list of (entry, fault) of failed creations.
+
+        """
+        entries = list(entries)
+        failed = []
+        for i in range(0, len(entries), chunk_size):
+            chunk = entries[i:i + chunk_size]
+            vals = [{"model": model, "res_id": int(res_id),
+                     "module": module, "name": xml_id}
+                    for model, res_id, (module, xml_id) in chunk]
+            if self.version() >= (12, ):
+                try:
+                    self._ooop.execute("ir.model.data", "create", vals)
+                    continue
+                except xmlrpclib.Fault:
+                    ## whole chunk was rejected, find culprits one by one
+                    pass
+            results = []
+            with self.batch() as batch:
+                for v in vals:
+                    results.append(batch.execute("ir.model.data", "create",
+                                                 v))
+            for entry, result in zip(chunk, results):
+                try:
+                    result.value
+                except xmlrpclib.Fault as e:
+                    failed.append((entry, e))
+        return failed
+
     def simple_filters(self, model, **kwargs):
         """Alternative syntax to OOOP filter
 
@@ -222,5 +691,25 @@ class OOOPExtended(object):
                                 limit=limit, offset=offset)
         return self._ooop.read(model, ids, fields=fields)
 
+    def search_read(self, model, domain, fields=[], order=None, limit=None):
+        """Return list of dict of records matching domain
+
+        Uses the server side ``search_read`` when available (odoo >= 8)
+        to get results in one round-trip, and fallbacks on ``get_all_d``.
+
+        """
+        if self.version() < (8, ):
+            return self.get_all_d(model, domain, order=order, limit=limit,
+                                  fields=fields)
+        return self._ooop.execute(model, "search_read", domain, fields,
+                                  0, limit or False, order or False)
+
+    @cache
     def version(self):
+        """Return server version, asked once per connection
+
+        It is not taken from a saved session, as the server may have been
+        upgraded since.
+
+        """
         return tuple(self._ooop.commonsock.version()['server_version_info'])
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""Compact cache of records values read in bulk
+
+``RecordCache`` reads records of a same model together, in chunks, and
+only the fields it is told to prefetch. It hands out ``Record`` objects
+that mimic the parts of the OOOP ``Data`` interface used by oem.
+
+"""
+
+import collections
+
+
+class RecordList(list):
+    """List of ``Record`` of the same model"""
+
+    def __init__(self, model, records=()):
+        super(RecordList, self).__init__(records)
+        self.model = model
+
+
+class Record(object):
+    """Read-only view on the cached values of a record
+
+    Gives access to ``_model``, ``_ref``, ``fields`` and to field values
+    as attributes. Relational values are ``Record`` (for many2one) or
+    ``RecordList`` (for x2many) of the same cache, and are not read
+    until one of their values is accessed.
+
+    Values can be overridden by setting attributes, as with OOOP objects.
+
+    """
+
+    def __init__(self, cache, model, res_id):
+        self.__dict__.update({
+            "_cache": cache,
+            "_model": model,
+            "_ref": res_id,
+        })
+
+    @property
+    def fields(self):
+        return self._cache.oe.get_fields(self._model)
+
+    def __getattr__(self, label):
+        if label.startswith("_") or label not in self.fields:
+            raise AttributeError(label)
+        return self._cache.value(self, label)
+
+    def __repr__(self):
+        return "<Record %s,%d>" % (self._model, self._ref)
+
+
+class RecordCache(object):
+    """Reads and keeps values of records in bulk
+
+    ``fields_for_model`` is a callable giving the list of field names to
+    read for a model. Records are registered for reading with
+    ``prefetch()`` (or ``browse()``), and ``load()`` reads all of them in
+    one batch of ``read`` calls of ``chunk_size`` records. Accessing a
+    value of a record not yet loaded triggers the ``load()`` of all
+    registered records of its model.
+
+    """
+
+    def __init__(self, oe, fields_for_model, chunk_size=200):
+        self.oe = oe
+        self.fields_for_model = fields_for_model
+        self.chunk_size = chunk_size
+        self._records = {}
+        self._values = {}
+        ## values kept by ``forget()``
+        self._kept = {}
+        self._pending = collections.defaultdict(collections.OrderedDict)
+
+    def get(self, model, res_id):
+        key = (model, int(res_id))
+        if key not in self._records:
+            self._records[key] = Record(self, model, key[1])
+        return self._records[key]
+
+    def browse(self, model, ids):
+        records = RecordList(model, [self.get(model, i) for i in ids])
+        self.prefetch(records)
+        return records
+
+    def prefetch(self, records):
+        """Register records to be read by the next ``load()``"""
+        for r in records:
+            if (r._model, r._ref) not in self._values:
+                self._pending[r._model][r._ref] = True
+
+    def load(self, model=None):
+        """Read values of all registered records (of ``model`` only if set)"""
+        models = [model] if model else self._pending.keys()
+        reads = []
+        with self.oe.batch() as batch:
+            for m in models:
+                ids = self._pending.pop(m, {}).keys()
+                fields = self.fields_for_model(m)
+                ## give some of the records to each concurrent job
+                size = min(self.chunk_size, -(-len(ids) // batch.jobs))
+                for i in range(0, len(ids), size):
+                    reads.append((m, batch.execute(
+                        m, "read", ids[i:i + size], fields,
+                        self.oe.context)))
+        for m, read in reads:
+            for values in read.value:
+                self._values[(m, values["id"])] = values
+                self._kept.pop((m, values["id"]), None)
+
+    def forget(self, records, keep=()):
+        """Drop ``records`` and their values, except those of ``keep`` fields
+
+        Allows to go through many records with bounded memory. Dropped
+        values are read again if ever accessed, and are not read along
+        fields missing from other records.
+
+        """
+        for r in records:
+            key = (r._model, r._ref)
+            self._records.pop(key, None)
+            values = self._values.pop(key, None)
+            if values is not None and keep:
+                self._kept[key] = dict((f, values[f])
+                                       for f in keep if f in values)
+
+    def value(self, record, label):
+        key = (record._model, record._ref)
+        if key not in self._values and label in self._kept.get(key, {}):
+            return self._convert(record.fields[label], self._kept[key][label])
+        if key not in self._values:
+            self.prefetch([record])
+            self.load(record._model)
+        if key not in self._values:
+            raise AttributeError("Object %s(%i) doesn't exist."
+                                 % (record._model, record._ref))
+        values = self._values[key]
+        if label not in values:
+            ## Not prefetched: read it for all records of model missing it
+            self.load_field(record._model, label)
+        return self._convert(record.fields[label], values[label])
+
+    def load_field(self, model, label):
+        """Read field ``label`` of all read records of ``model`` missing it
+
+        This is as many ``read`` of ``chunk_size`` records, in one batch.
+
+        """
+        ids = sorted(res_id for (m, res_id), values in self._values.iteritems()
+                     if m == model and label not in values)
+        reads = []
+        with self.oe.batch() as batch:
+            size = max(1, min(self.chunk_size, -(-len(ids) // batch.jobs)))
+            for i in range(0, len(ids), size):
+                reads.append(batch.execute(
+                    model, "read", ids[i:i + size], [label],
+                    self.oe.context))
+        for read in reads:
+            for values in read.value:
+                self._values[(model, values["id"])][label] = values[label]
+
+    def _convert(self, fdef, value):
+        """Convert raw read value as OOOP would"""
+        if fdef['ttype'] in ['many2one', 'one2one']:
+            return self.get(fdef['relation'], value[0]) if value else None
+        if fdef['ttype'] in ['one2many', 'many2many']:
+            return RecordList(fdef['relation'],
+                              [self.get(fdef['relation'], i)
+                               for i in value or []])
+        return value
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""Build XML ``<record>`` elements of records
+
+This is the native counterpart of the ``xml/record.xml`` template, and
+it works in two stages:
+
+- ``snapshot()`` reads all values of the record and resolves all the
+  xml_ids it references, producing a list of simple tuples.
+- ``build_record()`` makes the lxml element out of this snapshot, which
+  needs nothing else.
+
+    >>> items = [
+    ...     ("comment", " one2many field 'child_ids' managed on the "
+    ...                 "res.partner side "),
+    ...     ("field", "parent_id", [("ref", "base.main_partner")], None, None),
+    ...     ("field", "active", [("eval", "True")], None, None),
+    ...     ("field", "name", [], "text", u"Caf\\xe9 & Co"),
+    ...     ("field", "comment", [], "cdata", u"<b>bold</b>"),
+    ...     ("field", "arch", [], "arch", u"<form><field name='name'/></form>"),
+    ... ]
+    >>> print(etree.tostring(build_record("p1", "res.partner", items)))
+    ... # doctest: +NORMALIZE_WHITESPACE
+    <record id="p1" model="res.partner"><!-- one2many field 'child_ids'
+      managed on the res.partner side --><field name="parent_id"
+      ref="base.main_partner"/><field name="active"
+      eval="True"/><field name="name">Caf&#233; &amp; Co</field><field
+      name="comment"><![CDATA[<b>bold</b>]]></field><field name="arch"
+      type="xml"><form><field name="name"/></form></field></record>
+
+Snapshots being picklable, many of them can be rendered by several
+processes at once with ``render_records()``. Each process sends back
+what is needed to compare and write records without building them
+again: their digest, deps and text as laid out in a data file.
+
+    >>> snapshots = [Snapshot("p%d" % i, "res.partner", items)
+    ...              for i in range(20)]
+    >>> rendered = render_records(snapshots, "mymod", jobs=3)
+    >>> rendered == render_records(snapshots, "mymod")
+    True
+    >>> rendered[0].digest == common.xml_digest(build_record(*snapshots[0]))
+    True
+
+Digests being only needed to compare with existing records, they can
+be skipped:
+
+    >>> render_records(snapshots[:1], "mymod", digests=[False])[0].digest \\
+    ...     is None
+    True
+    >>> sorted(rendered[0].deps)
+    [('base', 'main_partner')]
+    >>> print(rendered[0].text)  # doctest: +ELLIPSIS
+        <record id="p0" model="res.partner">
+          <!-- one2many field 'child_ids' managed on the res.partner side -->
+          <field name="parent_id" ref="base.main_partner"/>
+          ...
+        </record>
+    <BLANKLINE>
+
+Elements are only built again when required:
+
+    >>> etree.tostring(rendered[0].element()) == \\
+    ...     etree.tostring(build_record(*snapshots[0]))
+    True
+
+"""
+
+import collections
+import os
+import multiprocessing
+
+from lxml import etree
+
+from . import common
+from . import data_file
+from . import tmpl
+
+
+Snapshot = collections.namedtuple("Snapshot", "xml_id model items")
+
+
+## parses records as laid out by ``_layout``
+_parser = etree.XMLParser(remove_blank_text=True, strip_cdata=False)
+
+
+class Rendered(collections.namedtuple("Rendered", "digest deps text")):
+    """Record rendered out of process, as ``render_records()`` gives it
+
+    ``digest`` is its ``common.xml_digest()`` (if asked), ``deps`` its
+    referenced
+    xml_ids, and ``text`` its XML as ``DataFileWriter`` writes it.
+
+    """
+
+    def element(self):
+        return etree.fromstring(self.text, _parser)
+
+
+def _missing(field, ttype, model, ids, db_identifier):
+    str_ids = ", ".join(str(i) for i in ids)
+    tmpl.output_message(
+        "    ! Missing xmlid for field %r (%s to %s) for those ids: %s"
+        % (field, ttype, model, str_ids))
+    return ("comment",
+            " MISSING xml_id for field %s (%s to %s) for those ids: %s "
+            "(db: %s) " % (field, ttype, model, str_ids, db_identifier))
+
+
+def snapshot(r, fields, xml_id_mgr, db_identifier):
+    """Return (items, deps) describing the XML record of ``r``
+
+    ``fields`` is the list of (name, definition) of fields to export, and
+    ``deps`` is the list of (module, name) of referenced xml_ids. Items
+    are tuples that ``build_record`` understands, and that can be
+    pickled.
+
+    """
+    items = []
+    deps = []
+    for f, fdef in fields:
+        if 'function' in fdef:
+            continue
+        ttype = fdef['ttype']
+        if ttype == "one2many":
+            items.append(("comment",
+                          " one2many field '%s' managed on the %s side "
+                          % (f, fdef['relation'])))
+            continue
+        value = getattr(r, f)
+        if ttype in ["many2one", "one2one"]:
+            if value is False or value is None:
+                continue
+            m, res_id = fdef['relation'], value._ref
+            xml_id = xml_id_mgr.lookup(m, res_id)
+            if xml_id is None:
+                items.append(_missing(f, ttype, m, [res_id], db_identifier))
+                continue
+            deps.append(xml_id)
+            items.append(("field", f, [("ref", "%s.%s" % xml_id)],
+                          None, None))
+        elif ttype == "many2many":
+            if value is None:
+                continue
+            xml_ids = [(v._ref, xml_id_mgr.lookup(value.model, v._ref))
+                       for v in value]
+            refs = ["(4, ref('%s.%s'))" % xml_id
+                    for _res_id, xml_id in xml_ids if xml_id is not None]
+            deps.extend(xml_id for _res_id, xml_id in xml_ids
+                        if xml_id is not None)
+            if refs:
+                items.append(("field", f,
+                              [("eval", "[%s]" % ", ".join(refs))],
+                              None, None))
+            anonymous_ids = [res_id for res_id, xml_id in xml_ids
+                             if xml_id is None]
+            if anonymous_ids:
+                items.append(_missing(f, ttype, value.model, anonymous_ids,
+                                      db_identifier))
+        elif ttype == "reference":
+            if not value:
+                continue
+            m, res_id = value.split(',', 1)
+            xml_id = xml_id_mgr.lookup(m, res_id)
+            if xml_id is None:
+                items.append(_missing(f, ttype, m, [res_id], db_identifier))
+                continue
+            deps.append(xml_id)
+            items.append(("field", f,
+                          [("eval", "'%s,' + str(ref('%s.%s'))"
+                                    % ((m, ) + tuple(xml_id)))],
+                          None, None))
+        elif ttype == "boolean":
+            items.append(("field", f, [("eval", repr(value))], None, None))
+        elif value is False:
+            continue
+        elif not isinstance(value, basestring):
+            items.append(("field", f, [], "text", unicode(value)))
+        else:
+            if not isinstance(value, unicode):
+                value = value.decode("utf-8")
+            kind = "arch" if f == "arch" and \
+                any(c in value for c in '<>&') else "text"
+            items.append(("field", f, [], kind, value))
+    return items, deps
+
+
+def build_record(xml_id, model, items):
+    """Return the lxml ``<record>`` element described by ``items``"""
+    record = etree.Element("record")
+    record.set("id", xml_id)
+    record.set("model", model)
+    for item in items:
+        if item[0] == "comment":
+            record.append(etree.Comment(item[1]))
+            continue
+        _tag, name, attrs, kind, value = item
+        field = etree.SubElement(record, "field")
+        field.set("name", name)
+        for attr, attr_value in attrs:
+            field.set(attr, attr_value)
+        if kind == "text":
+            field.text = value
+        elif kind == "cdata":
+            field.text = etree.CDATA(value)
+        elif kind == "arch":
+            try:
+                arch = etree.fromstring(value)
+            except Exception:
+                field.text = etree.CDATA(value)
+            else:
+                field.set("type", "xml")
+                field.append(arch)
+    return record
+
+
+def _layout(record):
+    """Return text of ``record`` indented as in a ``<data>`` element"""
+    ## blank text, as left by templates, would prevent indentation
+    record = etree.fromstring(etree.tostring(record), _parser)
+    ## serialize in place for the indentation to be right
+    root = etree.Element("openerp")
+    etree.SubElement(root, "data").append(record)
+    content = etree.tostring(root, pretty_print=True, encoding="utf-8")
+    start = content.index("<data>\n") + len("<data>\n")
+    return content[start:content.rindex("  </data>")]
+
+
+def render_record(snapshot, module_name, digest=True):
+    """Return the ``Rendered`` record of ``snapshot``"""
+    record = build_record(*snapshot)
+    return Rendered(common.xml_digest(record) if digest else None,
+                    data_file.record_deps(record, module_name)[0],
+                    _layout(record))
+
+
+def _render_record(args):
+    return render_record(*args)
+
+
+def render_records(snapshots, module_name, jobs=1, digests=None):
+    """Return the ``Rendered`` records of ``snapshots``, in order
+
+    With ``jobs`` greater than 1, records are rendered by as many worker
+    processes. ``module_name`` is used to qualify deps, and ``digests``
+    tells for each snapshot if its digest is needed (all by default).
+
+    """
+    if digests is None:
+        digests = [True] * len(snapshots)
+    args = [(snapshot, module_name, digest)
+            for snapshot, digest in zip(snapshots, digests)]
+    if jobs <= 1 or len(snapshots) < 2:
+        return [_render_record(a) for a in args]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return pool.map(_render_record, args,
+                        chunksize=max(1, len(args) // (jobs * 4)))
+    finally:
+        pool.close()
+        pool.join()
+
+
+class DataFileWriter(object):
+    """Writes a new XML data file one ``<record>`` at a time
+
+    The file is laid out as ``xmllint --format`` would, so that it is
+    the same as if it was written at once with ``xml2string``.
+
+        >>> import tempfile
+        >>> f = tempfile.NamedTemporaryFile()
+        >>> writer = DataFileWriter(f.name)
+        >>> writer.write(build_record("p1", "res.partner", [
+        ...     ("comment", " a comment "),
+        ...     ("field", "parent_id", [("ref", "base.main_partner")],
+        ...      None, None)]))
+        >>> writer.close()
+        >>> print(open(f.name).read())
+        <?xml version="1.0" encoding="utf-8"?>
+        <openerp>
+          <data>
+            <record id="p1" model="res.partner">
+              <!-- a comment -->
+              <field name="parent_id" ref="base.main_partner"/>
+            </record>
+          </data>
+        </openerp>
+
+    """
+
+    header = '<?xml version="1.0" encoding="utf-8"?>\n<openerp>\n  <data>\n'
+    footer = '  </data>\n</openerp>'
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, "w")
+        self.file.write(self.header)
+
+    def write(self, record):
+        """Write ``record``, an element or a ``Rendered`` record"""
+        if isinstance(record, Rendered):
+            self.file.write(record.text)
+        else:
+            self.file.write(_layout(record))
+
+    def close(self):
+        self.file.write(self.footer)
+        self.file.close()
+
+    def discard(self):
+        """Close and remove the file, which is left incomplete"""
+        self.file.close()
+        os.unlink(self.filename)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""Persistent stores for data that oem can reuse between invocations
+
+    >>> import tempfile
+    >>> store = PickleStore(tempfile.mkdtemp())
+
+Values are stored under tuple keys and survive the store instance::
+
+    >>> store.set(("db", "res.partner"), {"name": "char"})
+    >>> PickleStore(store.path).get(("db", "res.partner"))
+    {'name': 'char'}
+
+Missing keys return the default::
+
+    >>> store.get(("db", "res.users")) is None
+    True
+
+    >>> store.delete(("db", "res.partner"))
+    >>> store.get(("db", "res.partner"), "missing")
+    'missing'
+
+    >>> kf.rm(store.path, recursive=True)
+
+"""
+
+import os
+import os.path
+import errno
+import hashlib
+import tempfile
+import cPickle
+
+import kids.file as kf
+
+
+def cache_dir():
+    """Return the directory where oem keeps its cache files
+
+    Defaults to ``$XDG_CACHE_HOME/oem`` and can be forced with
+    ``$OEM_CACHE_DIR``.
+
+    """
+    if os.environ.get("OEM_CACHE_DIR"):
+        return os.environ["OEM_CACHE_DIR"]
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or
+        os.path.join(os.path.expanduser("~"), ".cache"),
+        "oem")
+
+
+class PickleStore(object):
+    """Key/value store keeping each value pickled in its own file
+
+    Writes are atomic, and files can be made private with ``mode``.
+
+    """
+
+    def __init__(self, path, mode=None):
+        self.path = path
+        self.mode = mode
+
+    def _filename(self, key):
+        key = "\0".join(k.encode("utf-8") if isinstance(k, unicode)
+                        else str(k) for k in key)
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest())
+
+    def get(self, key, default=None):
+        try:
+            with open(self._filename(key), "rb") as f:
+                return cPickle.load(f)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        except (EOFError, cPickle.UnpicklingError):
+            ## corrupted or truncated file is a cache miss
+            pass
+        return default
+
+    def set(self, key, value):
+        if not os.path.isdir(self.path):
+            kf.mkdir(self.path, recursive=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                cPickle.dump(value, f, cPickle.HIGHEST_PROTOCOL)
+            if self.mode is not None:
+                os.chmod(tmp, self.mode)
+            os.rename(tmp, self._filename(key))
+        except:
+            os.unlink(tmp)
+            raise
+
+    def delete(self, key):
+        try:
+            os.unlink(self._filename(key))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+
+class FieldsCache(object):
+    """Persistent cache of models' ``fields_get`` of a database
+
+    Entries are stored per database label and model along with the server
+    version and a schema fingerprint, both of which must match to get a
+    hit. When they are not given, last known fields are returned, which
+    allows reading the cache without a live connection.
+
+    """
+
+    def __init__(self, label, store=None):
+        self.label = label
+        self.store = store or PickleStore(os.path.join(cache_dir(), "fields"))
+
+    def get(self, model, version=None, fingerprint=None):
+        entry = self.store.get((self.label, model))
+        if entry is None:
+            return None
+        if version is not None and entry["version"] != version:
+            return None
+        if fingerprint is not None and entry["fingerprint"] != fingerprint:
+            return None
+        return entry["fields"]
+
+    def set(self, model, fields, version, fingerprint):
+        self.store.set((self.label, model), {
+            "version": version,
+            "fingerprint": fingerprint,
+            "fields": fields,
+        })
+
+
+class DataFileCache(object):
+    """Persistent cache of what oem reads in the data files of modules
+
+    A summary is stored per file along with the size, modification time
+    and content hash of the file. It is returned as long as the file is
+    unchanged: either same size and time, or same content.
+
+        >>> path = kf.tmpfile()
+        >>> kf.put_contents(path, "<openerp/>")
+        >>> cache = DataFileCache(PickleStore(tempfile.mkdtemp()))
+        >>> fingerprint = cache.fingerprint(path)
+        >>> cache.set(("mod", path), fingerprint, {"records": []})
+        >>> cache.get(("mod", path), path)
+        {'records': []}
+
+    A touched file keeps its summary, a modified one doesn't:
+
+        >>> os.utime(path, (0, 0))
+        >>> cache.get(("mod", path), path)
+        {'records': []}
+        >>> kf.put_contents(path, "<odoo/>")
+        >>> cache.get(("mod", path), path) is None
+        True
+
+        >>> kf.rm(path)
+        >>> kf.rm(cache.store.path, recursive=True)
+
+    """
+
+    def __init__(self, store=None):
+        self.store = store or PickleStore(
+            os.path.join(cache_dir(), "data_files"))
+
+    def fingerprint(self, path):
+        """Return (size, mtime, content hash) of file ``path``
+
+        To be taken before reading the file, so that a change while
+        reading makes the stored summary outdated.
+
+        """
+        st = os.stat(path)
+        return st.st_size, st.st_mtime, self._digest(path)
+
+    def _digest(self, path):
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), ""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, key, path):
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        st = os.stat(path)
+        size, mtime, digest = entry["fingerprint"]
+        if (size, mtime) == (st.st_size, st.st_mtime):
+            return entry["summary"]
+        if size != st.st_size or digest != self._digest(path):
+            return None
+        ## only touched: avoid hashing it next time
+        entry["fingerprint"] = (size, st.st_mtime, digest)
+        self.store.set(key, entry)
+        return entry["summary"]
+
+    def set(self, key, fingerprint, summary):
+        self.store.set(key, {
+            "fingerprint": fingerprint,
+            "summary": summary,
+        })
+
+
+class SessionStore(object):
+    """Private store of authenticated sessions of a database
+
+    Sessions are stored per database label and credentials, in files only
+    readable by the current user. Passwords are never stored.
+
+    """
+
+    def __init__(self, label, store=None):
+        self.label = label
+        self.store = store or PickleStore(
+            os.path.join(cache_dir(), "sessions"), mode=0600)
+
+    def _key(self, creds):
+        digest = hashlib.sha1(repr(tuple(
+            creds.get(k) for k in ["host", "port", "dbname",
+                                   "user", "password"])))
+        return (self.label, digest.hexdigest())
+
+    def get(self, creds):
+        return self.store.get(self._key(creds))
+
+    def set(self, creds, session):
+        self.store.set(self._key(creds), session)
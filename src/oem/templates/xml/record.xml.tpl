@@ -26,7 +26,7 @@ from lxml import etree
                  deps.append(_xml_id)
            %>
            % if _xml_id is not None:
-             <field name=${repr(f)} ref=${repr(ref)} />
+             <field name=${_pa(f)} ref=${_pa(ref)} />
            % else:
               ${missing(f, fdef['ttype'], db_identifier, m, [res_id])}
            % endif
@@ -48,25 +48,25 @@ from lxml import etree
            <%
              xml_ids = [(v._ref, xml_id_mgr.lookup(value.model, v._ref))
                         for v in value]
-             xml_ids = [(id, None if _xml_id is None else ("%s.%s" % _xml_id))
-                            for id, _xml_id in xml_ids]
-             tuple_list = [("(4, ref(%r))" % x)
-                           for _,x in xml_ids if x is not None]
              for _, x in xml_ids:
                  if x is not None:
                      deps.append(x)
+             xml_ids = [(id, None if _xml_id is None else ("%s.%s" % _xml_id))
+                            for id, _xml_id in xml_ids]
+             tuple_list = [("(4, ref('%s'))" % x)
+                           for _,x in xml_ids if x is not None]
             %>
              % if len(tuple_list) > 0:
                <%
                   eval_field = "[%s]" % (", ".join(tuple_list))
                 %>
-                <field name=${repr(f)} eval=${_pa(eval_field)} />
+                <field name=${_pa(f)} eval=${_pa(eval_field)} />
              % endif
              <%
              anonymous_ids = [str(id) for id, x in xml_ids if x is None]
              %>
              % if len(anonymous_ids) > 0:
-                ${missing(f, fdef['ttype'], value.model, db_identifier, anonymous_ids)}
+                ${missing(f, fdef['ttype'], db_identifier, value.model, anonymous_ids)}
              % endif
          % endif
          <%
@@ -87,24 +87,24 @@ from lxml import etree
              m, res_id = value.split(',', 1)
              ref_xml_id = xml_id_mgr.lookup(m, res_id)
              if ref_xml_id:
-                 reference_eval = "'%s,' + str(ref(%r))" \
+                 reference_eval = "'%s,' + str(ref('%s'))" \
                                   % (m, "%s.%s" % ref_xml_id)
                  deps.append(ref_xml_id)
            %>
            % if ref_xml_id is None:
              ${missing(f, fdef['ttype'], db_identifier, m, [res_id])}
            % else:
-          <field name=${repr(f)} eval=${_pa(reference_eval)} />
+          <field name=${_pa(f)} eval=${_pa(reference_eval)} />
            % endif
          % endif
       % elif fdef['ttype'] == 'boolean':
-          <field name=${repr(f)} eval="${repr(value)}" />
+          <field name=${_pa(f)} eval="${repr(value)}" />
       % elif fdef['ttype'] != 'boolean' and value is False:
         <% pass %>
       % elif not isinstance(value, basestring):
-          <field name=${repr(f)}>${value}</field>
+          <field name=${_pa(f)}>${value}</field>
       % elif isinstance(value, basestring) and all(c not in getattr(r, f) for c in '<>&'):
-          <field name=${repr(f)}>${value.decode("utf-8") if not isinstance(value, unicode) else value}</field>
+          <field name=${_pa(f)}>${value.decode("utf-8") if not isinstance(value, unicode) else value}</field>
       % elif f == "arch":
           <%
              try:
@@ -115,10 +115,10 @@ from lxml import etree
           % if normalize:
           <field name="arch" type="xml">${normalize}</field>
           % else:
-          <field name=${repr(f)}><![CDATA[${value}]]></field>
+          <field name=${_pa(f)}><![CDATA[${value}]]></field>
           % endif
       % else:
-          <field name=${repr(f)}>${_pv(value)}</field>
+          <field name=${_pa(f)}>${_pv(value)}</field>
       % endif
     % endif
   % endfor
@@ -0,0 +1,63 @@
+# -*- encoding: utf-8 -*-
+"""Measure reading of module data files by several processes
+
+Writes FILES synthetic data files of RECORDS records each, and reads
+them with 1 to MAX_JOBS processes, as ``map_data`` does when they are
+not cached.
+
+Usage:
+
+    python bench_data_files.py [FILES [RECORDS [MAX_JOBS]]]
+
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from oem.data_file import summarize_files
+
+
+RECORD = """\
+    <record id="record_%(f)d_%(i)d" model="res.partner">
+      <field name="name">Record %(i)d</field>
+      <field name="parent_id" ref="record_%(f)d_0"/>
+      <field name="category_id" eval="[(4, ref('base.cat_%(i)d'))]"/>
+    </record>
+"""
+
+
+def write_files(directory, count, records):
+    paths = []
+    for f in range(count):
+        path = os.path.join(directory, "data_%d.xml" % f)
+        with open(path, "w") as fh:
+            fh.write('<?xml version="1.0" encoding="utf-8"?>\n'
+                     '<openerp>\n  <data>\n')
+            for i in range(records):
+                fh.write(RECORD % {"f": f, "i": i})
+            fh.write('  </data>\n</openerp>\n')
+        paths.append(path)
+    return paths
+
+
+def main(count=16, records=2000, max_jobs=4):
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_files(directory, count, records)
+        print("%d files of %d records" % (count, records))
+        print("%6s %10s" % ("jobs", "time"))
+        jobs = 1
+        while jobs <= max_jobs:
+            start = time.time()
+            summarize_files(paths, "mymod", jobs=jobs)
+            print("%6d %9.2fs" % (jobs, time.time() - start))
+            jobs *= 2
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,70 @@
+# -*- encoding: utf-8 -*-
+"""Measure rendering of records by several processes
+
+Renders RECORDS synthetic record snapshots with 1 to MAX_JOBS
+processes, as ``rec import --render-jobs`` does, and writes them to a
+new data file as the import does for new files. One job means building
+elements in process, as ``rec import`` does without ``--render-jobs``.
+Each worker process needs a core of its own to be of any help.
+
+Usage:
+
+    python bench_render.py [RECORDS [MAX_JOBS]]
+
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+from oem.data_file import record_deps
+from oem.record_xml import Snapshot, Rendered, DataFileWriter, \
+     build_record, render_records
+
+
+def snapshots(count):
+    arch = "<form>%s</form>" % ("<field name='name'/>" * 200)
+    items = [("field", "name", [], "text", u"Record & name"),
+             ("field", "parent_id", [("ref", "base.main_partner")],
+              None, None),
+             ("field", "active", [("eval", "True")], None, None),
+             ("field", "arch", [], "arch", arch)]
+    return [Snapshot("record_%d" % i, "ir.ui.view", items)
+            for i in range(count)]
+
+
+def write(data, jobs):
+    fd, filename = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        writer = DataFileWriter(filename)
+        if jobs > 1:
+            records = render_records(data, "mymod", jobs=jobs,
+                                     digests=[False] * len(data))
+        else:
+            records = (build_record(*snapshot) for snapshot in data)
+        for record in records:
+            ## as ``rec import`` needs them
+            if not isinstance(record, Rendered):
+                record_deps(record, "mymod")
+            writer.write(record)
+        writer.close()
+    finally:
+        os.unlink(filename)
+
+
+def main(count=20000, max_jobs=4):
+    data = snapshots(count)
+    print("%d records" % count)
+    print("%6s %10s" % ("jobs", "time"))
+    jobs = 1
+    while jobs <= max_jobs:
+        start = time.time()
+        write(data, jobs)
+        print("%6d %9.2fs" % (jobs, time.time() - start))
+        jobs *= 2
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,100 @@
+# -*- encoding: utf-8 -*-
+"""Compare decoding of XML-RPC and JSON-RPC responses by the transports
+
+Builds the response of a ``read`` of RECORDS views with big ``arch``
+fields in both protocols, and measures the time and peak memory that
+``PooledTransport.parse_response`` and ``JsonRpcTransport.parse_response``
+need to decode them from a fake HTTP response, plain and gzipped. Each
+measure is done in a forked process to get its own peak memory.
+
+Usage:
+
+    python bench_rpc_decode.py [RECORDS [ARCH_SIZE [REPEAT]]]
+
+"""
+
+import os
+import sys
+import time
+import json
+import resource
+import xmlrpclib
+from cStringIO import StringIO
+
+from oem.transport import PooledTransport
+from oem.jsonrpc import JsonRpcTransport
+
+
+class FakeResponse(object):
+    """Body of a HTTP response read from memory"""
+
+    def __init__(self, body, encoding=None):
+        self.body = StringIO(body)
+        self.headers = {"Content-Encoding": encoding} if encoding else {}
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def read(self, size=-1):
+        return self.body.read(size)
+
+
+def records(count, arch_size):
+    line = '  <field name="name" string="Name" attrs="{}"/>\n'
+    arch = "<form>\n%s</form>" % (line * (arch_size // len(line)))
+    return [{"id": i, "name": "view %d" % i, "model": "res.partner",
+             "arch": arch, "inherit_id": [1, "base view"],
+             "priority": 16, "active": True}
+            for i in range(count)]
+
+
+def peak_rss():
+    """Return peak resident memory of current process in KiB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(transport, body, encoding, repeat):
+    """Return (best time, extra peak memory) of decoding ``body``"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        transport.verbose = 0
+        base = peak_rss()
+        best = None
+        for _ in range(repeat):
+            start = time.time()
+            transport.parse_response(FakeResponse(body, encoding))
+            duration = time.time() - start
+            best = duration if best is None else min(best, duration)
+        os.write(write_fd, json.dumps([best, peak_rss() - base]))
+        os._exit(0)
+    os.close(write_fd)
+    result = os.read(read_fd, 1024)
+    os.waitpid(pid, 0)
+    return json.loads(result)
+
+
+def main(count=2000, arch_size=8192, repeat=3):
+    data = records(count, arch_size)
+    bodies = [
+        ("xmlrpc", PooledTransport(),
+         xmlrpclib.dumps((data, ), methodresponse=True)),
+        ("jsonrpc", JsonRpcTransport(),
+         json.dumps({"jsonrpc": "2.0", "id": 1, "result": data})),
+    ]
+    del data
+    print("%d records, arch of %d bytes, best of %d"
+          % (count, arch_size, repeat))
+    for label, transport, body in bodies:
+        for encoding, payload in [(None, body),
+                                  ("gzip", xmlrpclib.gzip_encode(body))]:
+            duration, memory = measure(transport, payload, encoding, repeat)
+            print("  %-8s %-5s %7.1f MiB  %8.3fs  %+8.1f MiB peak"
+                  % (label, encoding or "plain",
+                     len(payload) / 1024.0 / 1024, duration,
+                     memory / 1024.0))
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,121 @@
+# -*- encoding: utf-8 -*-
+"""Measure scaling of the o2m traversal of ``rec import``
+
+Runs ``Command.to_xml`` with ``follow_o2m`` on synthetic trees of
+records served by a local fake object source, so that only oem's own
+work is measured. Records are not rendered, as this is about the
+traversal. Time per record should stay flat as the tree grows.
+
+Usage:
+
+    python bench_to_xml.py [FANOUT [MAX_RECORDS]]
+
+"""
+
+import os
+import sys
+import time
+
+from oem.oem_rec import Command
+from oem.ooop_utils import Batch
+
+
+FIELDS = {
+    "name": {"name": "name", "ttype": "char", "relation": False},
+    "parent_id": {"name": "parent_id", "ttype": "many2one",
+                  "relation": "bench.node"},
+    "child_ids": {"name": "child_ids", "ttype": "one2many",
+                  "relation": "bench.node"},
+}
+
+
+class FakeOOOP(object):
+    """Local object source of a tree of ``count`` ``bench.node``
+
+    Node ``i`` has nodes ``i * fanout + 1`` to ``i * fanout + fanout``
+    as children.
+
+    """
+
+    multicall = False
+    jobs = 1
+    context = {"lang": "en_US"}
+
+    def __init__(self, count, fanout):
+        self.count = count
+        self.fanout = fanout
+        self._ooop = self
+
+    def version(self):
+        return (8, 0)
+
+    def batch(self, size=100, jobs=None):
+        return Batch(self, size=size)
+
+    def get_fields(self, model):
+        return FIELDS
+
+    def execute(self, model, method, ids, fields=None, context=None):
+        assert method == "read"
+        return [{"id": i,
+                 "name": "node %d" % i,
+                 "parent_id": [(i - 1) // self.fanout, "parent"]
+                              if i else False,
+                 "child_ids": range(i * self.fanout + 1,
+                                    min(self.count,
+                                        i * self.fanout + self.fanout + 1))}
+                for i in ids]
+
+    def get_xml_ids(self, model_res_ids):
+        return dict(((int(res_id), model), None)
+                    for model, res_id in model_res_ids)
+
+    def get_xml_id(self, model, res_id):
+        return None
+
+    def search_read(self, model, domain, fields=[], order=None, limit=None):
+        return []
+
+
+class BenchCommand(Command):
+
+    module_name = "bench"
+    db_identifier = "bench"
+
+    def map_data(self):
+        return {}, [], {}
+
+    def get_fields_for_model(self, model):
+        return ["name", "parent_id", "child_ids"]
+
+    def record_to_xml(self, record, xml_id, follow_o2m=None):
+        return [(record, xml_id, [])]
+
+
+def run(count, fanout):
+    command = BenchCommand()
+    command.o = FakeOOOP(count, fanout)
+    root = command.record_cache.get("bench.node", 0)
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        start = time.time()
+        content = command.to_xml([root], follow_o2m=True)
+        duration = time.time() - start
+    finally:
+        sys.stdout = stdout
+    assert len(content) == count
+    return duration
+
+
+def main(fanout=10, max_records=100000):
+    print("%8s %10s %14s" % ("records", "time", "per record"))
+    count = 1000
+    while count <= max_records:
+        duration = run(count, fanout)
+        print("%8d %9.2fs %12.1fus"
+              % (count, duration, duration / count * 1000000))
+        count *= 10
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:]])
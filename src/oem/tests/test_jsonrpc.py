@@ -0,0 +1,70 @@
+# -*- encoding: utf-8 -*-
+
+import sys
+import unittest
+import xmlrpclib
+from StringIO import StringIO
+
+from oem.jsonrpc import fault_from_error
+from oem.oem_rec import Command
+
+from .test_ooop_utils import FakeOOOPExtended
+
+
+## as sent by OpenERP 7 and Odoo 8 when writing in an unknown language
+UNKNOWN_LANG = {
+    "code": 200, "message": "OpenERP Server Error",
+    "data": {
+        "name": "openerp.osv.orm.except_orm",
+        "message": "('Constraint Error', 'Language code of translation "
+                   "item must be among known languages')",
+        "arguments": ["Constraint Error",
+                      "Language code of translation item must be among "
+                      "known languages"],
+        "debug": "Traceback (most recent call last): ...",
+    },
+}
+
+
+class JsonRpcObject(object):
+    """``object`` service answering errors as ``JsonRpcTransport`` does"""
+
+    class system(object):
+
+        @staticmethod
+        def multicall(calls):
+            raise fault_from_error({"code": 200, "message": "Error", "data": {
+                "name": "exceptions.KeyError", "message": "'system'",
+                "arguments": ["system"], "debug": "..."}})
+
+    def __init__(self, error):
+        self.error = error
+
+    def execute(self, *args):
+        raise fault_from_error(self.error)
+
+
+class WriteNamesTest(unittest.TestCase):
+
+    def write_names(self, error):
+        cmd = Command()
+        cmd.o = FakeOOOPExtended(JsonRpcObject(error))
+        stdout, sys.stdout = sys.stdout, StringIO()
+        try:
+            cmd._write_names([("res.partner", 1, "Agrolait")], "xx_XX", {})
+        finally:
+            stdout, sys.stdout = sys.stdout, stdout
+        return stdout.getvalue()
+
+    def test_unknown_language(self):
+        self.assertEqual(self.write_names(UNKNOWN_LANG),
+                         "    ! language 'xx_XX' not known.\n")
+
+    def test_other_fault(self):
+        error = dict(UNKNOWN_LANG, data=dict(
+            UNKNOWN_LANG["data"],
+            arguments=["ValidateError", "Field name is required"]))
+        with self.assertRaises(xmlrpclib.Fault) as cm:
+            self.write_names(error)
+        self.assertEqual(cm.exception.faultCode,
+                         "warning -- ValidateError\n\nField name is required")
@@ -0,0 +1,137 @@
+# -*- encoding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import kids.file as kf
+
+from oem import data_file, oem_rec
+from oem.oem_rec import Command
+from oem.store import DataFileCache, PickleStore
+
+
+MANIFEST = """\
+{"name": "mymod", "version": "1.0", "depends": ["base"],
+ "data": ["a.xml", "b.xml", "c.xml"]}
+"""
+
+RECORD = """\
+    <record id="%s" model="res.partner">
+      <field name="parent_id" ref="%s"/>%s
+    </record>
+"""
+
+
+def record(xmlid, ref, fields=""):
+    return RECORD % (xmlid, ref, fields)
+
+
+def data(*records):
+    return ('<?xml version="1.0" encoding="utf-8"?>\n<openerp>\n  <data>\n' +
+            "".join(records) +
+            '  </data>\n</openerp>\n')
+
+
+class LintCommand(Command):
+    """Command on module ``root`` without any database"""
+
+    def __init__(self, root, store):
+        self._root = root
+        self._store = store
+
+    root = property(lambda self: self._root)
+    metadata_file = property(
+        lambda self: os.path.join(self.root, "__openerp__.py"))
+    data_file_cache = property(lambda self: DataFileCache(self._store))
+
+
+class IncrementalLintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, "mymod")
+        kf.mkdir(self.root)
+        self.store = PickleStore(os.path.join(self.tmp, "cache"))
+        kf.put_contents(os.path.join(self.root, "__openerp__.py"), MANIFEST)
+        for name, content in [
+                ("a.xml", data(record("a1", "base.main_partner"))),
+                ("b.xml", data(record("b1", "a1"))),
+                ("c.xml", data(record("c1", "base.main_partner")))]:
+            kf.put_contents(os.path.join(self.root, name), content)
+
+        self.parsed = []
+        self._summarize_files = data_file.summarize_files
+        self._load = oem_rec.load
+
+        def summarize_files(paths, *args, **kwargs):
+            self.parsed.extend(os.path.basename(p) for p in paths)
+            return self._summarize_files(paths, *args, **kwargs)
+
+        def load(path, *args, **kwargs):
+            self.parsed.append(os.path.basename(path))
+            return self._load(path, *args, **kwargs)
+
+        data_file.summarize_files = summarize_files
+        oem_rec.load = load
+
+    def tearDown(self):
+        data_file.summarize_files = self._summarize_files
+        oem_rec.load = self._load
+        shutil.rmtree(self.tmp)
+
+    def command(self):
+        return LintCommand(self.root, self.store)
+
+    def import_a2(self):
+        """Add to a.xml a record using c.xml and another module"""
+        kf.put_contents(os.path.join(self.root, "a.xml"), data(
+            record("a1", "base.main_partner"),
+            record("a2", "c1", '\n      <field name="category_id"'
+                         ' eval="[(4, ref(\'othermod.cat\'))]"/>')))
+
+    def manifest(self):
+        cmd = self.command()
+        return cmd.meta["data"], cmd.meta["depends"]
+
+    def test_same_as_full_lint(self):
+        cmd = self.command()
+        cmd.map_data()
+        self.assertEqual(sorted(self.parsed), ["a.xml", "b.xml", "c.xml"])
+
+        ## import writes a.xml, then lints what changed
+        del self.parsed[:]
+        self.import_a2()
+        cmd._lint_changes({
+            ("mymod", "a2"): ("a.xml", set([("mymod", "c1"),
+                                            ("othermod", "cat")])),
+        })
+        self.assertEqual(self.parsed, [],
+                         msg="No data file should be read again.")
+        incremental = self.manifest()
+        self.assertEqual(incremental, (["c.xml", "a.xml", "b.xml"],
+                                       ["base", "othermod"]))
+
+        ## full lint of the same files from the original manifest
+        kf.put_contents(os.path.join(self.root, "__openerp__.py"), MANIFEST)
+        del self.parsed[:]
+        self.command().lint({"-c": True})
+        self.assertEqual(self.parsed, ["a.xml"],
+                         msg="Only the changed file should be read again.")
+        self.assertEqual(self.manifest(), incremental)
+
+    def test_no_change_needed(self):
+        cmd = self.command()
+        cmd.map_data()
+        kf.put_contents(os.path.join(self.root, "c.xml"), data(
+            record("c1", "base.main_partner"), record("c2", "b1")))
+        cmd._lint_changes({
+            ("mymod", "c2"): ("c.xml", set([("mymod", "b1")])),
+        })
+        self.assertEqual(self.manifest(), (["a.xml", "b.xml", "c.xml"],
+                                           ["base"]))
+        kf.put_contents(os.path.join(self.root, "__openerp__.py"), MANIFEST)
+        self.command().lint({"-c": True})
+        self.assertEqual(self.manifest(), (["a.xml", "b.xml", "c.xml"],
+                                           ["base"]))
@@ -0,0 +1,199 @@
+# -*- encoding: utf-8 -*-
+
+import threading
+import unittest
+import xmlrpclib
+
+from SimpleXMLRPCServer import SimpleXMLRPCDispatcher
+
+from oem.ooop_utils import OOOPExtended
+
+
+class LoopbackProxy(object):
+    """``xmlrpclib.ServerProxy`` calling a dispatcher in process
+
+    Calls are marshalled as they would be on the wire, and ``requests``
+    counts them.
+
+    """
+
+    def __init__(self, dispatcher, name=None, requests=None):
+        self._dispatcher = dispatcher
+        self._name = name
+        self.requests = requests if requests is not None else [0]
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return LoopbackProxy(
+            self._dispatcher,
+            "%s.%s" % (self._name, name) if self._name else name,
+            self.requests)
+
+    def __call__(self, *args):
+        self.requests[0] += 1
+        response = self._dispatcher._marshaled_dispatch(
+            xmlrpclib.dumps(args, self._name, allow_none=True))
+        return xmlrpclib.loads(response)[0][0]
+
+
+class ObjectService(object):
+    """Fake ``object`` service of a server"""
+
+    def __init__(self):
+        self.created = []
+
+    def execute(self, dbname, uid, pwd, model, method, *args):
+        if method == "name_get":
+            return [[i, "%s,%d" % (model, i)] for i in args[0]]
+        if method == "create":
+            vals = args[0]
+            for v in (vals if isinstance(vals, list) else [vals]):
+                if v["name"] == "bad":
+                    raise xmlrpclib.Fault(
+                        "warning -- Constraint Error",
+                        "duplicate key value violates unique constraint")
+            self.created.extend(vals if isinstance(vals, list) else [vals])
+            return len(self.created)
+        raise xmlrpclib.Fault("error", "unknown method %s" % method)
+
+
+class FakeOOOP(object):
+
+    dbname, uid, pwd = "db", 1, "admin"
+    protocol = "xmlrpc"
+
+    def __init__(self, objectsock):
+        self.objectsock = objectsock
+
+    def execute(self, model, *args):
+        return self.objectsock.execute(self.dbname, self.uid, self.pwd,
+                                       model, *args)
+
+
+class FakeOOOPExtended(OOOPExtended):
+
+    def __init__(self, objectsock, version=(12, 0)):
+        self._ooop = FakeOOOP(objectsock)
+        self._version = version
+
+    def version(self):
+        return self._version
+
+
+def connect(multicall=True, version=(12, 0)):
+    service = ObjectService()
+    dispatcher = SimpleXMLRPCDispatcher(allow_none=True, encoding=None)
+    dispatcher.register_instance(service)
+    if multicall:
+        dispatcher.register_multicall_functions()
+    proxy = LoopbackProxy(dispatcher)
+    return FakeOOOPExtended(proxy, version=version), service, proxy.requests
+
+
+class BatchTest(unittest.TestCase):
+
+    def queue(self, batch):
+        return [batch.execute("res.partner", "name_get", [1, 2]),
+                batch.execute("res.partner", "unlink", [3]),
+                batch.execute("res.users", "name_get", [4])]
+
+    def check_results(self, results):
+        self.assertEqual(results[0].value,
+                         [[1, "res.partner,1"], [2, "res.partner,2"]])
+        with self.assertRaises(xmlrpclib.Fault) as cm:
+            results[1].value
+        self.assertIn("unknown method unlink", cm.exception.faultString)
+        self.assertEqual(results[2].value, [[4, "res.users,4"]])
+
+    def test_multicall(self):
+        oe, _service, requests = connect()
+        with oe.batch() as batch:
+            results = self.queue(batch)
+        self.assertEqual(requests[0], 1,
+                         msg="All calls should be sent in one request.")
+        self.assertTrue(oe.multicall)
+        self.check_results(results)
+
+    def test_sequential_fallback(self):
+        oe, _service, requests = connect(multicall=False)
+        with oe.batch() as batch:
+            results = self.queue(batch)
+        self.assertIs(oe.multicall, False)
+        self.assertEqual(requests[0], 1 + 3,
+                         msg="A failed multicall, then one call each.")
+        self.check_results(results)
+
+        ## server is not asked again for multicall support
+        with oe.batch() as batch:
+            results = self.queue(batch)
+        self.assertEqual(requests[0], 4 + 3)
+        self.check_results(results)
+
+    def test_concurrent_jobs(self):
+        threads = threading.active_count()
+        for multicall in [True, False]:
+            oe, _service, _requests = connect(multicall=multicall)
+            with oe.batch(jobs=2) as batch:
+                results = self.queue(batch) + self.queue(batch)
+            self.check_results(results[:3])
+            self.check_results(results[3:])
+        self.assertEqual(threading.active_count(), threads,
+                         msg="Threads should not outlive the batch.")
+
+    def test_flush_on_size(self):
+        oe, _service, requests = connect()
+        batch = oe.batch(size=2)
+        results = self.queue(batch)
+        self.assertEqual(requests[0], 1,
+                         msg="First 2 calls should be sent when queued.")
+        results[0].value
+        with self.assertRaises(RuntimeError):
+            results[2].value
+        batch.flush()
+        self.check_results(results)
+
+    def test_not_sent_on_error(self):
+        oe, _service, requests = connect()
+        with self.assertRaises(ZeroDivisionError):
+            with oe.batch() as batch:
+                result = batch.execute("res.partner", "name_get", [1])
+                1 / 0
+        self.assertEqual(requests[0], 0)
+        with self.assertRaises(RuntimeError):
+            result.value
+
+
+class SetXmlIdsTest(unittest.TestCase):
+
+    entries = [("res.partner", 1, ("mymod", "p1")),
+               ("res.partner", 2, ("mymod", "bad")),
+               ("res.partner", 3, ("mymod", "p3"))]
+
+    def check(self, oe, service):
+        failed = oe.set_xml_ids(self.entries)
+        self.assertEqual([entry for entry, _fault in failed],
+                         [self.entries[1]])
+        self.assertIn("duplicate key", failed[0][1].faultString)
+        self.assertEqual([v["name"] for v in service.created], ["p1", "p3"])
+
+    def test_bulk_create(self):
+        oe, service, requests = connect()
+        self.assertEqual(oe.set_xml_ids(self.entries[:1] +
+                                        self.entries[2:]), [])
+        self.assertEqual(requests[0], 1)
+
+    def test_rejected_chunk(self):
+        ## whole chunk rejected, then created one by one in a multicall
+        oe, service, requests = connect()
+        self.check(oe, service)
+        self.assertEqual(requests[0], 2)
+
+    def test_rejected_chunk_without_multicall(self):
+        oe, service, requests = connect(multicall=False)
+        self.check(oe, service)
+
+    def test_old_server(self):
+        oe, service, requests = connect(version=(8, 0))
+        self.check(oe, service)
+        self.assertEqual(requests[0], 1)
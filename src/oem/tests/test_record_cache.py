@@ -0,0 +1,66 @@
+# -*- encoding: utf-8 -*-
+
+import contextlib
+import unittest
+
+from oem.record_cache import RecordCache
+
+
+class Result(object):
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Batch(object):
+
+    jobs = 1
+
+    def __init__(self, oe):
+        self.oe = oe
+
+    def execute(self, model, method, ids, fields, context):
+        self.oe.reads.append((ids, fields))
+        return Result([dict([("id", i)] + [(f, "%s %d" % (f, i))
+                                           for f in fields])
+                       for i in ids])
+
+
+class FakeOE(object):
+    """Answers ``read`` of char fields, and records them in ``reads``"""
+
+    context = {}
+
+    def __init__(self):
+        self.reads = []
+
+    @contextlib.contextmanager
+    def batch(self):
+        yield Batch(self)
+
+    def get_fields(self, model):
+        return {"name": {"ttype": "char"}, "comment": {"ttype": "char"}}
+
+
+class ForgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.oe = FakeOE()
+        self.cache = RecordCache(self.oe, lambda model: ["name"])
+
+    def test_forgotten_not_read_again(self):
+        first = self.cache.browse("res.partner", [1, 2])
+        self.assertEqual(first[0].name, "name 1")
+        self.cache.forget(first, keep=["name"])
+        second = self.cache.browse("res.partner", [3, 4])
+        self.cache.load()
+        del self.oe.reads[:]
+        self.assertEqual(second[0].comment, "comment 3")
+        self.assertEqual(self.oe.reads, [([3, 4], ["comment"])],
+                         msg="Forgotten records should not be read again.")
+
+        del self.oe.reads[:]
+        self.assertEqual([r.name for r in first], ["name 1", "name 2"])
+        self.assertEqual(self.oe.reads, [], msg="Kept values are served.")
+        self.assertEqual(first[1].comment, "comment 2")
+        self.assertEqual(self.oe.reads, [([2], ["name"]), ([2], ["comment"])])
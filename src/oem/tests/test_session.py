@@ -0,0 +1,165 @@
+# -*- encoding: utf-8 -*-
+
+import collections
+import unittest
+import xmlrpclib
+
+from SimpleXMLRPCServer import SimpleXMLRPCDispatcher
+
+from oem.ooop_utils import OOOPExtended
+
+
+class Server(object):
+    """Fake server, counting calls by (model, method)"""
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.models = ["res.partner", "res.users"]
+        self.modules = [{"name": "base", "latest_version": "8.0.1.3"}]
+        self.version = [8, 0, 0, "final", 0]
+        self.uids = set()
+
+    ## ``common`` service
+
+    def login(self, db, user, pwd):
+        self.calls["login"] += 1
+        self.uids.add(1)
+        return 1
+
+    def version_(self):
+        self.calls["version"] += 1
+        return {"server_version_info": self.version}
+
+    ## ``object`` service
+
+    def execute(self, db, uid, pwd, model, method, *args):
+        self.calls[(model, method)] += 1
+        if uid not in self.uids:
+            raise xmlrpclib.Fault("AccessDenied", "Access denied")
+        if (model, method) == ("res.users", "check_access_rights"):
+            return True
+        if (model, method) == ("ir.model", "fields_get"):
+            return {"model": {"type": "char"}, "transient": {"type": "bool"}}
+        if (model, method) == ("ir.model", "search"):
+            return range(1, len(self.models) + 1)
+        if (model, method) == ("ir.model", "read"):
+            return [{"id": i, "model": m, "transient": False}
+                    for i, m in enumerate(self.models, 1)]
+        if (model, method) == ("ir.model.fields", "search_read"):
+            return [{"id": 1, "write_date": "2020-01-01 00:00:00"}]
+        if (model, method) == ("ir.module.module", "search_read"):
+            return self.modules
+        raise xmlrpclib.Fault("error", "unknown method %s" % method)
+
+    def dispatcher(self, service):
+        dispatcher = SimpleXMLRPCDispatcher(allow_none=True, encoding=None)
+        if service == "common":
+            dispatcher.register_function(self.login, "login")
+            dispatcher.register_function(self.version_, "version")
+        else:
+            dispatcher.register_function(self.execute, "execute")
+        return dispatcher
+
+
+class LoopbackTransport(xmlrpclib.Transport):
+    """Sends requests to the dispatchers of ``server`` in process"""
+
+    def __init__(self, server):
+        xmlrpclib.Transport.__init__(self)
+        self.server = server
+
+    def request(self, host, handler, request_body, verbose=0):
+        dispatcher = self.server.dispatcher(handler.split("/")[-1])
+        return xmlrpclib.loads(
+            dispatcher._marshaled_dispatch(request_body))[0]
+
+
+class SessionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server()
+
+    def connect(self, session=None):
+        self.server.calls.clear()
+        return OOOPExtended(
+            user="admin", pwd="admin", dbname="db", uri="http://fake",
+            port=8069, load_models=False,
+            transport=LoopbackTransport(self.server), session=session)
+
+    def calls(self):
+        calls = dict(self.server.calls)
+        self.server.calls.clear()
+        return calls
+
+    def saved_session(self):
+        o = self.connect()
+        o.model_catalog()
+        return o.session()
+
+    def test_no_catalog_used(self):
+        o = self.connect()
+        self.assertEqual(self.calls(), {"login": 1})
+        self.assertEqual(o.session(), {"uid": 1, "context": {}})
+        self.assertEqual(self.calls(), {},
+                         msg="Unused catalog should not be loaded.")
+
+    def test_catalog_used(self):
+        o = self.connect()
+        o.model_catalog()
+        session = o.session()
+        self.assertEqual(sorted(session["models"]),
+                         ["res.partner", "res.users"])
+        self.assertEqual(session["version"], (8, 0, 0, "final", 0))
+        self.assertIsNotNone(session["fingerprint"])
+
+    def test_reuse(self):
+        saved = self.saved_session()
+        o = self.connect(saved)
+        self.assertEqual(self.calls(),
+                         {("res.users", "check_access_rights"): 1})
+        self.assertEqual(o.session(), saved,
+                         msg="Unchanged session should not be written.")
+        self.assertEqual(self.calls(), {})
+
+    def test_reuse_catalog(self):
+        saved = self.saved_session()
+        o = self.connect(saved)
+        self.calls()
+        self.assertTrue(o.model_exists("res.partner"))
+        self.assertEqual(self.calls(), {
+            "version": 1,
+            ("ir.model.fields", "search_read"): 1,
+            ("ir.module.module", "search_read"): 1,
+        })
+        self.assertEqual(o.session(), saved)
+
+    def test_schema_changed(self):
+        saved = self.saved_session()
+        self.server.models.append("x.new")
+        self.server.modules.append({"name": "x", "latest_version": "1"})
+        o = self.connect(saved)
+        self.assertTrue(o.model_exists("x.new"))
+        self.assertEqual(self.calls()[("ir.model", "read")], 1)
+        session = o.session()
+        self.assertIn("x.new", session["models"])
+        self.assertNotEqual(session["fingerprint"], saved["fingerprint"])
+
+    def test_server_upgraded(self):
+        saved = self.saved_session()
+        self.server.version = [9, 0, 0, "final", 0]
+        o = self.connect(saved)
+        o.model_catalog()
+        self.assertEqual(self.calls()[("ir.model", "read")], 1)
+        self.assertEqual(o.session()["version"], (9, 0, 0, "final", 0))
+
+    def test_invalid_session(self):
+        saved = self.saved_session()
+        self.server.uids.clear()
+        o = self.connect(saved)
+        self.assertEqual(self.calls(), {
+            ("res.users", "check_access_rights"): 1,
+            "login": 1,
+        })
+        o.model_catalog()
+        self.assertEqual(self.calls()[("ir.model", "read")], 1,
+                         msg="Catalog of an invalid session is not used.")
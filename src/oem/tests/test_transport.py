@@ -0,0 +1,127 @@
+# -*- encoding: utf-8 -*-
+
+import unittest
+import xmlrpclib
+from cStringIO import StringIO
+
+from oem.transport import PooledTransport
+
+
+class FakeResponse(object):
+
+    will_close = False
+
+    def __init__(self, status, body="", encoding=None):
+        self.status = status
+        self.reason = "reason"
+        self.msg = {}
+        self.body = StringIO(body)
+        self.headers = {"Content-Encoding": encoding} if encoding else {}
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def read(self, size=-1):
+        return self.body.read(size)
+
+
+class FakeConnection(object):
+    """Connection answering the next of ``server.responses``"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def putrequest(self, method, handler, **kwargs):
+        self.headers = {}
+
+    def putheader(self, name, value):
+        self.headers[name] = value
+
+    def endheaders(self, body):
+        self.server.requests.append((self.headers, body))
+
+    def getresponse(self, buffering=False):
+        return self.server.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+class FakeServer(object):
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def compressed(self):
+        return [headers.get("Content-Encoding") == "gzip"
+                for headers, _body in self.requests]
+
+
+class Transport(PooledTransport):
+
+    def __init__(self, server):
+        PooledTransport.__init__(self, gzip_threshold=10)
+        self.server = server
+
+    def _new_connection(self, host):
+        return FakeConnection(self.server)
+
+
+def ok(result="done", encoding=None):
+    body = xmlrpclib.dumps((result, ), methodresponse=True)
+    if encoding == "gzip":
+        body = xmlrpclib.gzip_encode(body)
+    return FakeResponse(200, body, encoding)
+
+
+BIG = xmlrpclib.dumps((["x" * 100], ), "write")
+
+
+class GzipRequestTest(unittest.TestCase):
+
+    def test_refused(self):
+        for status in [415, 400]:
+            server = FakeServer(FakeResponse(status), ok(), ok())
+            transport = Transport(server)
+            self.assertEqual(transport.request("host", "/xmlrpc", BIG),
+                             ("done", ))
+            self.assertEqual(server.compressed(), [True, False])
+            ## not tried anymore on this host
+            transport.request("host", "/xmlrpc", BIG)
+            self.assertEqual(server.compressed(), [True, False, False])
+
+    def test_other_errors_not_sent_again(self):
+        ## the call may have been run, as when a proxy times out
+        for status in [401, 500, 502, 504]:
+            server = FakeServer(FakeResponse(status), ok())
+            transport = Transport(server)
+            with self.assertRaises(xmlrpclib.ProtocolError) as cm:
+                transport.request("host", "/xmlrpc", BIG)
+            self.assertEqual(cm.exception.errcode, status)
+            self.assertEqual(server.compressed(), [True])
+            transport.request("host", "/xmlrpc", BIG)
+            self.assertEqual(server.compressed(), [True, True])
+
+    def test_small_request(self):
+        server = FakeServer(FakeResponse(415))
+        with self.assertRaises(xmlrpclib.ProtocolError):
+            Transport(server).request("host", "/xmlrpc", "<small/>")
+        self.assertEqual(server.compressed(), [False])
+
+
+class CountersTest(unittest.TestCase):
+
+    def test_compressed(self):
+        result = ["x" * 100000]
+        server = FakeServer(ok(result, "gzip"))
+        transport = Transport(server)
+        transport.request("host", "/xmlrpc", BIG)
+        body = xmlrpclib.dumps((result, ), methodresponse=True)
+        stats = transport.stats
+        self.assertEqual(stats["received"],
+                         len(xmlrpclib.gzip_encode(body)))
+        self.assertEqual(stats["received_raw"], len(body))
+        self.assertEqual(stats["sent_raw"], len(BIG))
+        self.assertEqual(stats["sent"], len(server.requests[0][1]))
+        self.assertTrue(stats["sent"] < stats["sent_raw"])
@@ -0,0 +1,106 @@
+# -*- encoding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import kids.file as kf
+
+from oem import common
+from oem.common import write_file, replace_file, temp_path
+from oem.record_xml import DataFileWriter, build_record
+
+
+class Interrupted(Exception):
+    pass
+
+
+class WriteFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "data.xml")
+        kf.put_contents(self.path, "old")
+        ## so that any write is seen
+        os.utime(self.path, (0, 0))
+        self.inode = os.stat(self.path).st_ino
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assertUntouched(self):
+        st = os.stat(self.path)
+        self.assertEqual((st.st_ino, st.st_mtime), (self.inode, 0))
+        self.assertEqual(kf.get_contents(self.path), "old")
+        self.assertEqual(os.listdir(self.tmp), ["data.xml"],
+                         msg="No temporary file should be left.")
+
+    def test_unchanged(self):
+        self.assertFalse(write_file(self.path, "old"))
+        self.assertUntouched()
+
+    def test_changed(self):
+        self.assertTrue(write_file(self.path, "new"))
+        self.assertEqual(kf.get_contents(self.path), "new")
+        self.assertEqual(os.listdir(self.tmp), ["data.xml"])
+
+    def test_interrupted_write(self):
+        put_contents = kf.put_contents
+
+        def interrupted(path, contents):
+            put_contents(path, contents[:2])
+            raise Interrupted()
+
+        kf.put_contents = interrupted
+        try:
+            with self.assertRaises(Interrupted):
+                write_file(self.path, "new content")
+        finally:
+            kf.put_contents = put_contents
+        self.assertUntouched()
+
+    def test_interrupted_rename(self):
+        rename = os.rename
+
+        def interrupted(src, dst):
+            raise Interrupted()
+
+        common.os.rename = interrupted
+        try:
+            with self.assertRaises(Interrupted):
+                write_file(self.path, "new content")
+        finally:
+            common.os.rename = rename
+        self.assertUntouched()
+
+    def test_replace_unchanged(self):
+        temp = temp_path(self.path)
+        kf.put_contents(temp, "old")
+        self.assertFalse(replace_file(self.path, temp))
+        self.assertUntouched()
+
+    def test_interrupted_writer(self):
+        ## streamed data file not closed before the interruption
+        writer = DataFileWriter(temp_path(self.path))
+        writer.write(build_record("p1", "res.partner", []))
+        writer.discard()
+        self.assertUntouched()
+
+    def test_writer_unchanged(self):
+        writer = DataFileWriter(temp_path(self.path))
+        writer.write(build_record("p1", "res.partner", []))
+        writer.close()
+        self.assertTrue(replace_file(self.path, writer.filename))
+        os.utime(self.path, (0, 0))
+        self.inode = os.stat(self.path).st_ino
+        content = kf.get_contents(self.path)
+
+        writer = DataFileWriter(temp_path(self.path))
+        writer.write(build_record("p1", "res.partner", []))
+        writer.close()
+        self.assertFalse(replace_file(self.path, writer.filename))
+        st = os.stat(self.path)
+        self.assertEqual((st.st_ino, st.st_mtime), (self.inode, 0))
+        self.assertEqual(kf.get_contents(self.path), content)
+        self.assertEqual(os.listdir(self.tmp), ["data.xml"])
@@ -0,0 +1,99 @@
+# -*- encoding: utf-8 -*-
+
+import unittest
+
+from oem.xml_id_mgr import XmlIdManager
+
+
+class FakeOOOP(object):
+    """Database holding ``ir.model.data`` as (module, model, name, res_id)"""
+
+    def __init__(self, xml_ids=()):
+        self.xml_ids = list(xml_ids)
+        self.searches = []
+
+    def get_xml_id(self, model, res_id):
+        for module, m, name, i in self.xml_ids:
+            if (m, i) == (model, res_id):
+                return module, name
+        return None
+
+    def search_read(self, model, domain, fields=None):
+        assert model == "ir.model.data"
+        crit = dict((f, v) for f, _op, v in domain)
+        self.searches.append((crit["module"], crit["model"]))
+        return [{"name": name} for module, m, name, _i in self.xml_ids
+                if (module, m) == (crit["module"], crit["model"])]
+
+
+class XmlIdManagerTest(unittest.TestCase):
+
+    def test_sequential_names(self):
+        mgr = XmlIdManager(FakeOOOP(), [])
+        self.assertEqual(
+            [mgr.create("mymod", "res.partner", i, "Agrolait")
+             for i in range(1, 4)],
+            [("mymod", "res_partner_agrolait_r0"),
+             ("mymod", "res_partner_agrolait_r1"),
+             ("mymod", "res_partner_agrolait_r2")])
+
+    def test_known_record(self):
+        ooop = FakeOOOP([("base", "res.partner", "main_partner", 1)])
+        mgr = XmlIdManager(ooop, [])
+        self.assertEqual(mgr.create("mymod", "res.partner", 1, "Agrolait"),
+                         ("base", "main_partner"))
+        name = mgr.create("mymod", "res.partner", 2, "Agrolait")
+        self.assertEqual(mgr.create("mymod", "res.partner", 2, "Agrolait"),
+                         name)
+        self.assertEqual(mgr.lookup("res.partner", 2), name)
+
+    def test_db_collision(self):
+        ooop = FakeOOOP([
+            ("mymod", "res.partner", "res_partner_agrolait_r0", 10),
+            ("mymod", "res.partner", "res_partner_agrolait_r2", 12),
+            ## same name in other modules is not a collision
+            ("other", "res.partner", "res_partner_agrolait_r1", 11),
+        ])
+        mgr = XmlIdManager(ooop, [])
+        self.assertEqual(
+            [mgr.create("mymod", "res.partner", i, "Agrolait")[1]
+             for i in range(1, 4)],
+            ["res_partner_agrolait_r1",
+             "res_partner_agrolait_r3",
+             "res_partner_agrolait_r4"])
+        self.assertEqual(ooop.searches, [("mymod", "res.partner")],
+                         msg="Database names should be read only once.")
+
+    def test_file_collision(self):
+        ## record of the file not yet in the database
+        mgr = XmlIdManager(FakeOOOP(), [
+            ("mymod", "res_partner_agrolait_r0"),
+            ("other", "res_partner_agrolait_r1"),
+        ])
+        self.assertEqual(
+            [mgr.create("mymod", "res.partner", i, "Agrolait")[1]
+             for i in range(1, 3)],
+            ["res_partner_agrolait_r1", "res_partner_agrolait_r2"])
+
+    def test_models_of_same_module(self):
+        ooop = FakeOOOP([
+            ("mymod", "res.partner", "res_partner_agrolait_r0", 10),
+            ("mymod", "res.users", "res_users_agrolait_r0", 20),
+        ])
+        mgr = XmlIdManager(ooop, [])
+        self.assertEqual(
+            [mgr.create("mymod", "res.partner", 1, "Agrolait"),
+             mgr.create("mymod", "res.users", 1, "Agrolait"),
+             mgr.create("mymod", "res.partner", 2, "Agrolait"),
+             mgr.create("mymod", "res.users", 2, "Agrolait")],
+            [("mymod", "res_partner_agrolait_r1"),
+             ("mymod", "res_users_agrolait_r1"),
+             ("mymod", "res_partner_agrolait_r2"),
+             ("mymod", "res_users_agrolait_r2")])
+        self.assertEqual(ooop.searches, [("mymod", "res.partner"),
+                                         ("mymod", "res.users")])
+        ## records of both models are known under their own model
+        self.assertEqual(mgr.lookup("res.partner", 1),
+                         ("mymod", "res_partner_agrolait_r1"))
+        self.assertEqual(mgr.lookup("res.users", 1),
+                         ("mymod", "res_users_agrolait_r1"))
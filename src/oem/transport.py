@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""Persistent HTTP/1.1 transport for XML-RPC
+
+``PooledTransport`` keeps connections open between calls and shares them
+through a ``ConnectionPool``, so that all ``ServerProxy`` of a same
+database (``common``, ``object``, ``report``) reuse the same few TCP (and
+TLS) connections instead of opening a new one per call.
+
+Responses are asked gzip compressed, and request bodies bigger than
+``gzip_threshold`` are sent compressed, unless the host refused them
+once.
+
+    >>> pool = ConnectionPool(size=2, idle_timeout=30)
+    >>> sorted(pool.stats.items())  # doctest: +NORMALIZE_WHITESPACE
+    [('opened', 0), ('received', 0), ('received_raw', 0), ('requests', 0),
+     ('reused', 0), ('sent', 0), ('sent_raw', 0)]
+
+"""
+
+import time
+import zlib
+import socket
+import errno
+import httplib
+import threading
+import collections
+import xmlrpclib
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of idle HTTP connections per host
+
+    At most ``size`` idle connections are kept per host, and connections
+    that stayed idle more than ``idle_timeout`` seconds are closed instead
+    of being reused, as servers are likely to have dropped them.
+
+    ``stats`` counts ``opened`` connections, ``reused`` ones and the total
+    number of ``requests``. It also counts bytes ``sent`` and ``received``
+    on the wire, and their uncompressed size (``sent_raw`` and
+    ``received_raw``).
+
+    """
+
+    def __init__(self, size=4, idle_timeout=60):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.stats = {"opened": 0, "reused": 0, "requests": 0,
+                      "sent": 0, "sent_raw": 0,
+                      "received": 0, "received_raw": 0}
+        self._idle = collections.defaultdict(list)
+        self._lock = threading.Lock()
+
+    def count(self, **counters):
+        with self._lock:
+            for label, value in counters.iteritems():
+                self.stats[label] += value
+
+    def acquire(self, key, factory):
+        """Return (connection, reused) for ``key``
+
+        ``factory`` is called to create a new connection when no usable
+        idle one is left.
+
+        """
+        now = time.time()
+        with self._lock:
+            self.stats["requests"] += 1
+            idle = self._idle[key]
+            while idle:
+                conn, since = idle.pop()
+                if now - since <= self.idle_timeout:
+                    self.stats["reused"] += 1
+                    return conn, True
+                conn.close()
+            self.stats["opened"] += 1
+        return factory(), False
+
+    def release(self, key, conn):
+        """Give back a connection that can be reused"""
+        with self._lock:
+            idle = self._idle[key]
+            if len(idle) < self.size:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idles, self._idle = self._idle, collections.defaultdict(list)
+        for idle in idles.values():
+            for conn, _since in idle:
+                conn.close()
+
+
+class DecodedResponse(object):
+    """File-like reader of a HTTP response body
+
+    The body is gunzipped on the fly if needed, and both the wire and
+    decoded sizes are given to ``count`` as they are read.
+
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, response, count):
+        self.response = response
+        self.count = count
+        self.decompressor = None
+        if response.getheader("Content-Encoding", "") == "gzip":
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._buffer = ""
+        self._eof = False
+
+    def _read_chunk(self):
+        chunk = self.response.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            data = self.decompressor.flush() if self.decompressor else ""
+            self.count(received_raw=len(data))
+            return data
+        data = self.decompressor.decompress(chunk) if self.decompressor \
+               else chunk
+        self.count(received=len(chunk), received_raw=len(data))
+        return data
+
+    def read(self, size=-1):
+        if size < 0:
+            chunks = [self._buffer]
+            while not self._eof:
+                chunks.append(self._read_chunk())
+            self._buffer = ""
+            return "".join(chunks)
+        while not self._eof and len(self._buffer) < size:
+            self._buffer += self._read_chunk()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class PooledTransport(xmlrpclib.Transport):
+    """XML-RPC transport taking its connections from a ``ConnectionPool``
+
+    A same instance can be given to several ``ServerProxy`` and used from
+    several threads.
+
+    Request bodies bigger than ``gzip_threshold`` bytes are gzipped
+    (``None`` disables it). As not all servers or proxies support this,
+    a host refusing a compressed request with one of the ``gzip_refused``
+    statuses gets the request again uncompressed, and won't receive
+    compressed requests anymore.
+
+    """
+
+    content_type = "text/xml"
+
+    ## Unsupported Media Type, and Bad Request from less precise servers
+    gzip_refused = (415, 400)
+
+    def __init__(self, pool=None, https=False, use_datetime=0,
+                 gzip_threshold=64 * 1024):
+        xmlrpclib.Transport.__init__(self, use_datetime=use_datetime)
+        self.pool = pool or ConnectionPool()
+        self.https = https
+        self.gzip_threshold = gzip_threshold
+        self._no_gzip_hosts = set()
+
+    @property
+    def stats(self):
+        return self.pool.stats
+
+    def _new_connection(self, host):
+        chost, _extra_headers, x509 = self.get_host_info(host)
+        if self.https:
+            return httplib.HTTPSConnection(chost, None, **(x509 or {}))
+        return httplib.HTTPConnection(chost)
+
+    def _compress(self, host, request_body):
+        return self.gzip_threshold is not None and \
+               len(request_body) > self.gzip_threshold and \
+               host not in self._no_gzip_hosts
+
+    def request(self, host, handler, request_body, verbose=0):
+        ## a reused connection may have been closed by the server in the
+        ## meantime, this is only worth one retry on a fresh connection.
+        while True:
+            conn, reused = self.pool.acquire(
+                host, lambda: self._new_connection(host))
+            compress = self._compress(host, request_body)
+            try:
+                return self._request(conn, host, handler, request_body,
+                                     verbose, compress)
+            except xmlrpclib.ProtocolError as e:
+                ## any other error may come after the call was run
+                if not compress or e.errcode not in self.gzip_refused:
+                    raise
+                self._no_gzip_hosts.add(host)
+            except socket.error as e:
+                if not reused or e.errno not in (errno.ECONNRESET,
+                                                 errno.ECONNABORTED,
+                                                 errno.EPIPE):
+                    raise
+            except httplib.BadStatusLine:
+                if not reused:
+                    raise
+
+    def _request(self, conn, host, handler, request_body, verbose,
+                 compress=False):
+        if verbose:
+            conn.set_debuglevel(1)
+        body = xmlrpclib.gzip_encode(request_body) if compress \
+               else request_body
+        self.pool.count(sent=len(body), sent_raw=len(request_body))
+        try:
+            ## extra headers (as authorization) are host dependent
+            _chost, self._extra_headers, _x509 = self.get_host_info(host)
+            self.send_request(conn, handler, body)
+            self.send_host(conn, host)
+            self.send_user_agent(conn)
+            self.send_content(conn, body, compress)
+
+            response = conn.getresponse(buffering=True)
+            if response.status == 200:
+                self.verbose = verbose
+                result = self.parse_response(response)
+            else:
+                response.read()
+                raise xmlrpclib.ProtocolError(
+                    host + handler, response.status, response.reason,
+                    response.msg)
+        except xmlrpclib.Fault:
+            self.pool.release(host, conn)
+            raise
+        except Exception:
+            ## connection is left in an unknown state
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self.pool.release(host, conn)
+        return result
+
+    def send_content(self, connection, request_body, compressed=False):
+        connection.putheader("Content-Type", self.content_type)
+        if compressed:
+            connection.putheader("Content-Encoding", "gzip")
+        connection.putheader("Content-Length", str(len(request_body)))
+        connection.endheaders(request_body)
+
+    def parse_response(self, response):
+        stream = DecodedResponse(response, self.pool.count)
+        parser, unmarshaller = self.getparser()
+        while True:
+            data = stream.read(DecodedResponse.chunk_size)
+            if not data:
+                break
+            if self.verbose:
+                print "body:", repr(data)
+            parser.feed(data)
+        parser.close()
+        return unmarshaller.close()
+
+    def close(self):
+        self.pool.close()
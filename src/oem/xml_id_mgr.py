@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import collections
+
 from common import normalize_xml_name, get_natural_sort_key
 
 
@@ -7,12 +9,25 @@ XMLID_MAXSIZE = 128
 
 
 class XmlIdManager(object):
-    """Manages creation and lookup of xml_id in OOOP database or XML files"""
+    """Manages creation and lookup of xml_id in OOOP database or XML files
+
+    ``file_xml_ids`` are the (module, name) of xml_ids declared in XML
+    files.
+
+    """
 
     def __init__(self, ooop_instance, file_xml_ids):
         self.ooop = ooop_instance
         self._xml_ids = {}
-        self._file_xml_ids = file_xml_ids[:]
+        self._db_xml_ids = {}
+        ## names already taken, by module
+        self._names = collections.defaultdict(set)
+        for module, name in file_xml_ids:
+            self._names[module].add(name)
+        ## (module, model) whose database names are in ``_names``
+        self._loaded = set()
+        ## next suffix to try, by (module, name prefix)
+        self._next_index = {}
 
     def get_xml_id_sort_key(self, obj):
         """return a sort key for objects"""
@@ -27,9 +42,40 @@ class XmlIdManager(object):
             model = model_or_obj._model
         else:
             model = model_or_obj
-        if (res_id, model) in self._xml_ids:
-            return self._xml_ids[(res_id, model)]
-        return self.ooop.get_xml_id(model, res_id)
+        key = (int(res_id), model)
+        if key in self._xml_ids:
+            return self._xml_ids[key]
+        if key not in self._db_xml_ids:
+            self._db_xml_ids[key] = self.ooop.get_xml_id(model, res_id)
+        return self._db_xml_ids[key]
+
+    def prefetch(self, model_res_ids):
+        """Resolve xml_ids of all given (model, res_id) in bulk
+
+        Results are kept so that following ``lookup`` calls on these
+        objects won't require any request to the database. All the objects
+        not yet known are resolved in one batch of requests.
+
+        """
+        missing = set()
+        for model, res_id in model_res_ids:
+            key = (int(res_id), model)
+            if key in self._xml_ids or key in self._db_xml_ids:
+                continue
+            missing.add((model, key[0]))
+        if missing:
+            self._db_xml_ids.update(self.ooop.get_xml_ids(missing))
+
+    def _taken_names(self, module, model):
+        """Return set of names taken in module, with those of model in db"""
+        if (module, model) not in self._loaded:
+            self._names[module].update(
+                r["name"] for r in self.ooop.search_read(
+                    "ir.model.data",
+                    [("module", "=", module), ("model", "=", model)],
+                    fields=["name"]))
+            self._loaded.add((module, model))
+        return self._names[module]
 
     def create(self, module, model, res_id, seed_name):
         lookup = self.lookup(model, res_id)
@@ -37,28 +83,18 @@ class XmlIdManager(object):
             ## Object already existent
             return lookup
 
-        ## local names
-        all_names = [n for (m, n) in self._xml_ids.values()
-                     if m == module]
-        ## distant names
-        ## XXXvlab: could cache these results
-        objs = self.ooop.get_model("ir.model.data").filter(
-            module=module, model=model)
-        all_names += [obj.name for obj in objs]
-        all_names += self._file_xml_ids
-        all_names = set(all_names)
-
-        i = 0
+        names = self._taken_names(module, model)
         model_normalized = normalize_xml_name(model)
         seed_normalized = normalize_xml_name(
             seed_name,
             max_size=XMLID_MAXSIZE - 10 - len(model_normalized))
-        name = "%s_%s_r%d" % (model_normalized, seed_normalized, i)
-        while name in all_names:
+        prefix = "%s_%s_r" % (model_normalized, seed_normalized)
+        i = self._next_index.get((module, prefix), 0)
+        while "%s%d" % (prefix, i) in names:
             i += 1
-            name = "%s_%s_r%d" % (model_normalized, seed_normalized, i)
+        self._next_index[(module, prefix)] = i + 1
+        name = "%s%d" % (prefix, i)
+        names.add(name)
         ## add xml_id to cache.
-        # print "    | new xmlid for (%s, %d): %r" \
-        #       % (model, res_id, name)
-        self._xml_ids[(res_id, model)] = (module, name)
+        self._xml_ids[(int(res_id), model)] = (module, name)
         return module, name